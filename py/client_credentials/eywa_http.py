@@ -0,0 +1,147 @@
+"""
+Shared async HTTP client for the client credentials scripts
+
+One client keeps a pool of keep-alive connections to EYWA and is used
+for both /oauth/token and /graphql, so a test run pays for connection
+(and TLS) setup once instead of on every request. At most `concurrency`
+requests are in flight at a time.
+
+httpx is used when it is installed, with HTTP/2 if the h2 package is
+available too. Otherwise requests are sent through a pooled
+requests.Session on worker threads.
+
+    async with EywaHttp("http://localhost:8080") as client:
+        response = await client.token(client_id, client_secret, "read:data")
+        token = response.json()["access_token"]
+        response = await client.graphql("{ __typename }", token=token)
+"""
+
+import asyncio
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401, only needed by httpx for HTTP/2
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_URL = "http://localhost:8080"
+CONCURRENCY = 10
+TIMEOUT = 10
+
+FORM_HEADERS = {
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Accept": "application/json"
+}
+
+
+class TransportError(Exception):
+    """
+    Network level failure, whichever HTTP library is underneath.
+    """
+
+
+class HttpxTransport:
+    name = "httpx"
+
+    def __init__(self, concurrency, timeout, http2):
+        limits = httpx.Limits(max_connections=concurrency,
+                              max_keepalive_connections=concurrency)
+        self.client = httpx.AsyncClient(http2=http2 and HTTP2, limits=limits,
+                                        timeout=timeout)
+        if http2 and HTTP2:
+            self.name = "httpx (HTTP/2)"
+
+    async def request(self, method, url, timeout, **kwargs):
+        try:
+            return await self.client.request(method, url, timeout=timeout,
+                                              **kwargs)
+        except httpx.HTTPError as e:
+            raise TransportError(str(e)) from e
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class RequestsTransport:
+    name = "requests"
+
+    def __init__(self, concurrency, timeout, http2):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    async def request(self, method, url, timeout, **kwargs):
+        try:
+            return await asyncio.to_thread(self.session.request, method, url,
+                                           timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+
+    async def close(self):
+        self.session.close()
+
+
+class EywaHttp:
+    def __init__(self, eywa_url=DEFAULT_URL, concurrency=CONCURRENCY,
+                 timeout=TIMEOUT, http2=True):
+        self.eywa_url = eywa_url.rstrip("/")
+        self.token_endpoint = f"{self.eywa_url}/oauth/token"
+        self.graphql_endpoint = f"{self.eywa_url}/graphql"
+        self.timeout = timeout
+        transport = HttpxTransport if httpx is not None else RequestsTransport
+        self.transport = transport(concurrency, timeout, http2)
+        self.slots = asyncio.Semaphore(concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.transport.close()
+
+    async def request(self, method, url, timeout=None, **kwargs):
+        """
+        Send a request through the pool. Returns the response of the
+        underlying library (status_code, headers, text and json() are
+        the same for both) or raises TransportError.
+        """
+        async with self.slots:
+            return await self.transport.request(method, url,
+                                                timeout or self.timeout,
+                                                **kwargs)
+
+    async def token(self, client_id, client_secret, scope=None, timeout=None):
+        """
+        Client credentials grant against /oauth/token.
+        """
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": client_id,
+            "client_secret": client_secret
+        }
+        if scope:
+            data["scope"] = scope
+        return await self.request("POST", self.token_endpoint, timeout,
+                                  data=data, headers=FORM_HEADERS)
+
+    async def graphql(self, query, variables=None, token=None, timeout=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        body = {"query": query}
+        if variables is not None:
+            body["variables"] = variables
+        return await self.request("POST", self.graphql_endpoint, timeout,
+                                  json=body, headers=headers)
@@ -0,0 +1,321 @@
+"""
+Local JWT verification against the issuer's published keys
+
+The signing keys (JWKS) are found through
+/.well-known/openid-configuration and fetched once, then kept until
+their max-age runs out. A token signed with a key id that is not in the
+set triggers one early refetch, so rotated keys are picked up without
+refetching for every unknown or forged kid.
+
+Signatures and claims (iss, exp, nbf, aud, nonce) are checked locally,
+and verified claims are kept in a small LRU keyed by a hash of the
+token, so repeated requests with the same token cost a dict lookup
+instead of a round trip or a signature check.
+
+RSA and EC signatures need the cryptography package. HS256 tokens can
+be checked when the shared secret is passed in.
+
+    verifier = Verifier("http://localhost:8080")
+    claims = verifier.verify(access_token)
+
+    python jwt_verify.py <token> [issuer]
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+    from cryptography.hazmat.primitives.asymmetric.utils import (
+        encode_dss_signature)
+except ImportError:
+    hashes = None
+
+
+DEFAULT_ISSUER = "http://localhost:8080"
+DISCOVERY = "/.well-known/openid-configuration"
+TIMEOUT = 10
+
+KEYS_TTL = 3600
+# Least time between refetches triggered by an unknown kid.
+REFRESH_INTERVAL = 30
+LEEWAY = 60
+CACHE_SIZE = 1024
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class JwtError(Exception):
+    """
+    Token is malformed, not signed by the issuer or its claims are not
+    valid (expired, wrong audience, ...).
+    """
+
+
+def unb64(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def b64_int(data):
+    return int.from_bytes(unb64(data), "big")
+
+
+def split(token):
+    """
+    Header, claims, signing input and signature of a compact JWT.
+    """
+    try:
+        header, payload, signature = token.split(".")
+        parts = (json.loads(unb64(header)), json.loads(unb64(payload)),
+                 f"{header}.{payload}".encode(), unb64(signature))
+    except (ValueError, AttributeError) as e:
+        raise JwtError(f"Malformed token: {e}") from e
+    if not isinstance(parts[0], dict) or not isinstance(parts[1], dict):
+        raise JwtError("Malformed token: header and claims must be objects")
+    return parts
+
+
+def unverified_claims(token):
+    return split(token)[1]
+
+
+if hashes is not None:
+    HASHES = {"256": hashes.SHA256, "384": hashes.SHA384,
+              "512": hashes.SHA512}
+    CURVES = {"P-256": ec.SECP256R1, "P-384": ec.SECP384R1,
+              "P-521": ec.SECP521R1}
+
+
+def public_key(jwk):
+    """
+    cryptography key for an RSA or EC JWK, None for other key types.
+    """
+    if hashes is None or jwk.get("use", "sig") != "sig":
+        return None
+    if jwk.get("kty") == "RSA":
+        return rsa.RSAPublicNumbers(b64_int(jwk["e"]),
+                                    b64_int(jwk["n"])).public_key()
+    if jwk.get("kty") == "EC" and jwk.get("crv") in CURVES:
+        return ec.EllipticCurvePublicNumbers(
+            b64_int(jwk["x"]), b64_int(jwk["y"]),
+            CURVES[jwk["crv"]]()).public_key()
+    return None
+
+
+def check_signature(alg, key, signing_input, signature):
+    if alg.startswith("HS"):
+        digest = getattr(hashlib, f"sha{alg[2:]}")
+        expected = hmac.new(key, signing_input, digest).digest()
+        if not hmac.compare_digest(expected, signature):
+            raise JwtError("Invalid signature")
+        return
+    if hashes is None:
+        raise JwtError(f"{alg} tokens need the cryptography package")
+    algorithm = HASHES[alg[2:]]()
+    try:
+        if alg.startswith("RS"):
+            key.verify(signature, signing_input, padding.PKCS1v15(),
+                       algorithm)
+        elif alg.startswith("PS"):
+            key.verify(signature, signing_input,
+                       padding.PSS(padding.MGF1(algorithm),
+                                   padding.PSS.DIGEST_LENGTH), algorithm)
+        else:
+            half = len(signature) // 2
+            key.verify(encode_dss_signature(
+                int.from_bytes(signature[:half], "big"),
+                int.from_bytes(signature[half:], "big")),
+                signing_input, ec.ECDSA(algorithm))
+    except (InvalidSignature, TypeError, ValueError) as e:
+        raise JwtError("Invalid signature") from e
+
+
+class KeySet:
+    """
+    JWKS of an issuer, fetched lazily and refreshed on expiry or when a
+    token names a kid that is not in the set.
+    """
+
+    def __init__(self, issuer=DEFAULT_ISSUER, session=None, ttl=KEYS_TTL,
+                 refresh_interval=REFRESH_INTERVAL, clock=time.monotonic):
+        self.issuer_url = issuer.rstrip("/")
+        self.session = session or requests.Session()
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.configuration = None
+        self.keys = {}
+        self.expires = 0
+        self.fetched = None
+        self.fetches = 0
+
+    def get(self, url):
+        try:
+            response = self.session.get(url, timeout=TIMEOUT)
+            response.raise_for_status()
+            return response.json(), response.headers.get("Cache-Control", "")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise JwtError(f"Could not fetch {url}: {e}") from e
+
+    @property
+    def issuer(self):
+        """
+        Issuer the tokens have to carry, as the discovery document
+        states it.
+        """
+        with self.lock:
+            self.discover()
+        return self.configuration.get("issuer", self.issuer_url)
+
+    def discover(self):
+        if self.configuration is None:
+            self.configuration, _ = self.get(self.issuer_url + DISCOVERY)
+
+    def refresh(self):
+        self.discover()
+        jwks_uri = self.configuration.get("jwks_uri")
+        if not jwks_uri:
+            raise JwtError(f"{self.issuer_url} publishes no jwks_uri")
+        jwks, cache_control = self.get(jwks_uri)
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            key = public_key(jwk)
+            if key is not None:
+                keys[jwk.get("kid")] = (jwk.get("alg"), key)
+        max_age = MAX_AGE.search(cache_control)
+        now = self.clock()
+        self.keys = keys
+        self.fetched = now
+        self.expires = now + (int(max_age.group(1)) if max_age else self.ttl)
+        self.fetches += 1
+
+    def key(self, kid, alg):
+        with self.lock:
+            now = self.clock()
+            if self.fetched is None or now >= self.expires:
+                self.refresh()
+            elif (kid not in self.keys
+                  and now - self.fetched >= self.refresh_interval):
+                # Probably rotated: the new key is published before use.
+                self.refresh()
+            if kid not in self.keys:
+                raise JwtError(f"Unknown signing key {kid!r}")
+            key_alg, key = self.keys[kid]
+        if key_alg and key_alg != alg:
+            raise JwtError(f"Key {kid!r} is for {key_alg}, token uses {alg}")
+        return key
+
+
+class Verifier:
+    def __init__(self, issuer=DEFAULT_ISSUER, audience=None, keys=None,
+                 secret=None, algorithms=None, leeway=LEEWAY,
+                 cache_size=CACHE_SIZE, clock=time.time):
+        self.keys = keys or KeySet(issuer)
+        self.audience = audience
+        self.secret = secret
+        self.algorithms = set(algorithms or (
+            ["HS256"] if secret is not None else
+            ["RS256", "RS384", "RS512", "PS256", "PS384", "PS512",
+             "ES256", "ES384", "ES512"]))
+        self.leeway = leeway
+        self.cache_size = cache_size
+        self.clock = clock
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def counters(self):
+        return {"cache hits": self.hits, "verified": self.misses,
+                "jwks fetches": self.keys.fetches}
+
+    def verify(self, token, nonce=None, audience=None):
+        """
+        Claims of token once its signature and claims check out.
+        Raises JwtError otherwise.
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        now = self.clock()
+        with self.lock:
+            claims = self.cache.get(digest)
+            if claims is not None:
+                self.cache.move_to_end(digest)
+                self.hits += 1
+        if claims is None:
+            claims = self.check_signature(token)
+            with self.lock:
+                self.misses += 1
+                self.cache[digest] = claims
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        # Time based claims change meaning as time passes, so they are
+        # checked on every call, cached or not.
+        self.check_claims(claims, now, nonce, audience or self.audience)
+        return claims
+
+    def check_signature(self, token):
+        header, claims, signing_input, signature = split(token)
+        alg = header.get("alg")
+        if alg not in self.algorithms:
+            raise JwtError(f"Algorithm {alg!r} is not allowed")
+        if alg.startswith("HS"):
+            key = self.secret
+        elif hashes is None:
+            raise JwtError(f"{alg} tokens need the cryptography package")
+        else:
+            key = self.keys.key(header.get("kid"), alg)
+        check_signature(alg, key, signing_input, signature)
+        if claims.get("iss") != self.keys.issuer:
+            raise JwtError(f"Issuer {claims.get('iss')!r} is not "
+                           f"{self.keys.issuer!r}")
+        return claims
+
+    def check_claims(self, claims, now, nonce, audience):
+        if "exp" in claims and now > claims["exp"] + self.leeway:
+            raise JwtError("Token has expired")
+        if "nbf" in claims and now < claims["nbf"] - self.leeway:
+            raise JwtError("Token is not valid yet")
+        if audience is not None:
+            audiences = claims.get("aud")
+            if isinstance(audiences, str):
+                audiences = [audiences]
+            if audience not in (audiences or []):
+                raise JwtError(f"Token is not meant for {audience!r}")
+        if nonce is not None and claims.get("nonce") != nonce:
+            raise JwtError("Nonce does not match")
+
+
+def main(token=None, issuer=DEFAULT_ISSUER):
+    if token is None:
+        print(__doc__)
+        return 1
+    verifier = Verifier(issuer)
+    try:
+        started = time.perf_counter()
+        claims = verifier.verify(token)
+        first = time.perf_counter()
+        verifier.verify(token)
+        cached = time.perf_counter()
+    except JwtError as e:
+        print(f"❌ {e}")
+        return 1
+    print(json.dumps(claims, indent=2))
+    print(f"✅ Verified in {(first - started) * 1000:.1f} ms "
+          f"(with JWKS fetch), {(cached - first) * 1e6:.0f} us from cache")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -6,18 +6,21 @@ This script demonstrates how to get an access token using the OAuth 2.1
 client credentials flow with EYWA.
 """
 
-import requests
+import asyncio
 import json
 import sys
-from urllib.parse import urlencode
 
+from eywa_http import EywaHttp, TransportError
+from token_manager import TokenError, TokenManager
 
-def get_access_token(eywa_url, client_id, client_secret, scope=None):
+
+async def get_access_token(tokens, client_id, client_secret, scope=None):
     """
     Get an access token using client credentials flow
     
     Args:
-        eywa_url: Base URL of EYWA server (e.g., http://localhost:8080)
+        tokens: TokenManager for the EYWA server, reusing a cached token
+            while it is valid
         client_id: OAuth client ID
         client_secret: OAuth client secret  
         scope: Optional scope parameter
@@ -25,84 +28,56 @@ def get_access_token(eywa_url, client_id, client_secret, scope=None):
     Returns:
         dict: Token response or error
     """
-    token_endpoint = f"{eywa_url}/oauth/token"
-    
-    # Prepare request data
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret
-    }
-    
-    if scope:
-        data["scope"] = scope
-    
-    # Set headers
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Accept": "application/json"
-    }
-    
     try:
-        print(f"🔑 Requesting access token from {token_endpoint}")
+        print(f"🔑 Requesting access token from {tokens.client.token_endpoint}")
         print(f"📋 Client ID: {client_id}")
         if scope:
             print(f"📋 Scope: {scope}")
         
-        response = requests.post(
-            token_endpoint,
-            data=urlencode(data),
-            headers=headers,
-            timeout=10
-        )
-        
-        print(f"📥 Response Status: {response.status_code}")
+        token = await tokens.get(client_id, client_secret, scope)
+        token_data = token.response(tokens.clock())
         
-        if response.status_code == 200:
-            token_data = response.json()
+        if token.source == "endpoint":
             print("✅ SUCCESS! Access token received:")
-            print(f"   Token Type: {token_data.get('type', 'Bearer')}")
-            print(f"   Expires In: {token_data.get('expires_in')} seconds")
-            print(f"   Scope: {token_data.get('scope', 'N/A')}")
-            print(f"   Access Token: {token_data.get('access_token', '')[:50]}...")
-            
-            return {
-                "success": True,
-                "access_token": token_data.get("access_token"),
-                "token_type": token_data.get("type", "Bearer"),
-                "expires_in": token_data.get("expires_in"),
-                "scope": token_data.get("scope")
-            }
         else:
-            error_data = response.json()
-            print("❌ ERROR: Failed to get access token")
-            print(f"   Error: {error_data.get('error')}")
-            print(f"   Description: {error_data.get('error_description')}")
-            
-            return {
-                "success": False,
-                "error": error_data.get("error"),
-                "error_description": error_data.get("error_description")
-            }
+            print(f"✅ SUCCESS! Reusing access token cached on {token.source}:")
+        print(f"   Token Type: {token_data['type']}")
+        print(f"   Expires In: {token_data['expires_in']} seconds")
+        print(f"   Scope: {token_data['scope'] or 'N/A'}")
+        print(f"   Access Token: {token_data['access_token'][:50]}...")
+        
+        return {
+            "success": True,
+            "access_token": token_data["access_token"],
+            "token_type": token_data["type"],
+            "expires_in": token_data["expires_in"],
+            "scope": token_data["scope"]
+        }
             
-    except requests.exceptions.RequestException as e:
+    except TokenError as e:
+        print(f"📥 Response Status: {e.status_code}")
+        print("❌ ERROR: Failed to get access token")
+        print(f"   Error: {e.error}")
+        print(f"   Description: {e.description}")
+        
+        return {
+            "success": False,
+            "error": e.error,
+            "error_description": e.description
+        }
+    except TransportError as e:
         print(f"❌ Network error: {e}")
         return {"success": False, "error": str(e)}
-    except json.JSONDecodeError as e:
-        print(f"❌ Invalid JSON response: {e}")
-        return {"success": False, "error": "Invalid JSON response"}
 
 
-def test_access_token(eywa_url, access_token):
+async def test_access_token(client, access_token):
     """
     Test the access token by making a GraphQL request
     
     Args:
-        eywa_url: Base URL of EYWA server
+        client: EywaHttp client for the EYWA server
         access_token: The access token to test
     """
-    graphql_endpoint = f"{eywa_url}/graphql"
-    
     # Simple introspection query
     query = """
     {
@@ -117,19 +92,9 @@ def test_access_token(eywa_url, access_token):
     }
     """
     
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
     try:
         print(f"\n🚀 Testing access token with GraphQL request...")
-        response = requests.post(
-            graphql_endpoint,
-            json={"query": query},
-            headers=headers,
-            timeout=10
-        )
+        response = await client.graphql(query, token=access_token)
         
         if response.status_code == 200:
             data = response.json()
@@ -141,12 +106,12 @@ def test_access_token(eywa_url, access_token):
             print(f"   Response: {response.text}")
             return False
             
-    except requests.exceptions.RequestException as e:
+    except TransportError as e:
         print(f"❌ GraphQL request failed: {e}")
         return False
 
 
-def main():
+async def main():
     """
     Main function - demonstrates client credentials flow usage
     """
@@ -172,8 +137,16 @@ def main():
     print(f"🎯 Target EYWA Server: {EYWA_URL}")
     print()
     
+    async with EywaHttp(EYWA_URL) as client, TokenManager(client) as tokens:
+        await run_demo(tokens, CLIENT_ID, CLIENT_SECRET, SCOPE)
+
+
+async def run_demo(tokens, client_id, client_secret, scope):
+    """
+    Get a token and try it against GraphQL over one pooled client
+    """
     # Step 1: Get access token
-    result = get_access_token(EYWA_URL, CLIENT_ID, CLIENT_SECRET, SCOPE)
+    result = await get_access_token(tokens, client_id, client_secret, scope)
     
     if not result["success"]:
         print("\n💡 Troubleshooting Tips:")
@@ -205,7 +178,7 @@ def main():
     
     # Step 2: Test the access token
     access_token = result["access_token"]
-    test_access_token(EYWA_URL, access_token)
+    await test_access_token(tokens.client, access_token)
     
     print(f"\n🎉 Demo completed successfully!")
     print(f"💰 You now have a valid access token that expires in {result['expires_in']} seconds")
@@ -213,4 +186,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -4,18 +4,93 @@ OAuth 2.1 Client Credentials Flow Test Script
 
 This script tests the client_credentials grant type implementation
 by making direct HTTP requests to the EYWA OAuth token endpoint.
+
+    python test_client_credentials.py [url]
+    python test_client_credentials.py [url] single
+    python test_client_credentials.py [url] load [workers] [30s | requests]
 """
 
-import requests
+import asyncio
+import itertools
 import json
+import math
 import sys
-from urllib.parse import urlencode
+import time
+from collections import Counter
+
+from eywa_http import EywaHttp, TransportError
+from token_manager import TokenError, TokenManager
+
+
+# Test cases
+TEST_CASES = [
+    {
+        "name": "Valid Client Credentials",
+        "client_id": "test-client-credentials-app",
+        "client_secret": "super-secret-key-123",
+        "scope": "read:data write:data",
+        "expected_success": True
+    },
+    {
+        "name": "Invalid Client ID",
+        "client_id": "nonexistent-client",
+        "client_secret": "super-secret-key-123",
+        "scope": "read:data",
+        "expected_success": False
+    },
+    {
+        "name": "Invalid Client Secret",
+        "client_id": "test-client-credentials-app",
+        "client_secret": "wrong-secret",
+        "scope": "read:data",
+        "expected_success": False
+    },
+    {
+        "name": "No Scope Specified",
+        "client_id": "test-client-credentials-app",
+        "client_secret": "super-secret-key-123",
+        "scope": None,
+        "expected_success": True
+    }
+]
+
+LOAD_WORKERS = 10
+LOAD_DURATION = 10
+GRAPHQL_CASE = "GraphQL Follow-up"
+FOLLOW_UP_QUERY = "{ __typename }"
+
+
+def percentile(values, share):
+    """
+    Nearest rank percentile of sorted values
+    """
+    if not values:
+        return 0.0
+    rank = math.ceil(share * len(values))
+    return values[min(len(values), max(rank, 1)) - 1]
+
+
+def is_rejection(response):
+    """
+    Whether response is an OAuth error response: any 4xx with an error
+    code, as servers answer bad clients with 400 or 401.
+    """
+    if not 400 <= response.status_code < 500:
+        return False
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    return isinstance(data, dict) and "error" in data
 
 
 class ClientCredentialsTest:
-    def __init__(self, eywa_url="http://localhost:8080"):
+    def __init__(self, eywa_url="http://localhost:8080", client=None,
+                 tokens=None):
         self.eywa_url = eywa_url
         self.token_endpoint = f"{eywa_url}/oauth/token"
+        self.client = client or EywaHttp(eywa_url)
+        self.tokens = tokens or TokenManager(self.client)
         
     def create_test_client(self):
         """
@@ -33,7 +108,18 @@ class ClientCredentialsTest:
             }
         }
     
-    def test_client_credentials_flow(self, client_id, client_secret, scope=None):
+    async def request_token(self, client_id, client_secret, scope=None):
+        """
+        Get a token through the token manager, returning it or the
+        TokenError/TransportError it failed with
+        """
+        try:
+            return await self.tokens.get(client_id, client_secret, scope)
+        except (TokenError, TransportError) as e:
+            return e
+
+    async def test_client_credentials_flow(self, client_id, client_secret,
+                                           scope=None, response=None):
         """
         Test the client credentials OAuth 2.1 flow
         
@@ -41,6 +127,7 @@ class ClientCredentialsTest:
             client_id: The client identifier
             client_secret: The client secret
             scope: Optional scope parameter
+            response: Result of request_token when it was already sent
             
         Returns:
             dict: Response from token endpoint
@@ -49,63 +136,43 @@ class ClientCredentialsTest:
         print(f"   Client ID: {client_id}")
         print(f"   Endpoint: {self.token_endpoint}")
         
-        # Prepare the request data
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": client_id,
-            "client_secret": client_secret
-        }
-        
         if scope:
-            data["scope"] = scope
             print(f"   Scope: {scope}")
         
-        # Set headers
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Accept": "application/json"
-        }
+        print("\n📤 Making token request...")
+        if response is None:
+            response = await self.request_token(client_id, client_secret, scope)
         
-        try:
-            print("\n📤 Making token request...")
-            response = requests.post(
-                self.token_endpoint,
-                data=urlencode(data),
-                headers=headers,
-                timeout=10
-            )
-            
+        if isinstance(response, TransportError):
+            print(f"❌ Request failed: {response}")
+            return {
+                "success": False,
+                "error": str(response)
+            }
+        
+        if isinstance(response, TokenError):
             print(f"📥 Response Status: {response.status_code}")
-            print(f"📥 Response Headers: {dict(response.headers)}")
-            
-            # Parse response
-            try:
-                response_data = response.json()
-                print(f"📥 Response Body: {json.dumps(response_data, indent=2)}")
-                
-                return {
-                    "success": response.status_code == 200,
-                    "status_code": response.status_code,
-                    "data": response_data,
-                    "headers": dict(response.headers)
-                }
-            except json.JSONDecodeError:
-                print(f"📥 Raw Response: {response.text}")
-                return {
-                    "success": False,
-                    "status_code": response.status_code,
-                    "error": "Invalid JSON response",
-                    "raw_response": response.text
-                }
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Request failed: {e}")
+            print(f"📥 Response Body: {json.dumps(response.data, indent=2)}")
             return {
                 "success": False,
-                "error": str(e)
+                "status_code": response.status_code,
+                "data": response.data
             }
+        
+        response_data = response.response(self.tokens.clock())
+        if response.source == "endpoint":
+            print("📥 Response Status: 200")
+        else:
+            print(f"♻️  Reusing token cached on {response.source}")
+        print(f"📥 Response Body: {json.dumps(response_data, indent=2)}")
+        
+        return {
+            "success": True,
+            "status_code": 200,
+            "data": response_data
+        }
     
-    def test_with_access_token(self, access_token):
+    async def test_with_access_token(self, access_token):
         """
         Test using the access token to make a GraphQL request
         
@@ -114,8 +181,6 @@ class ClientCredentialsTest:
         """
         print("\n🚀 Testing access token with GraphQL request...")
         
-        graphql_endpoint = f"{self.eywa_url}/graphql"
-        
         # Simple GraphQL query to test authentication
         query = """
         {
@@ -127,18 +192,8 @@ class ClientCredentialsTest:
         }
         """
         
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        
         try:
-            response = requests.post(
-                graphql_endpoint,
-                json={"query": query},
-                headers=headers,
-                timeout=10
-            )
+            response = await self.client.graphql(query, token=access_token)
             
             print(f"📥 GraphQL Response Status: {response.status_code}")
             
@@ -149,10 +204,10 @@ class ClientCredentialsTest:
             else:
                 print(f"❌ GraphQL request failed: {response.text}")
                 
-        except requests.exceptions.RequestException as e:
+        except TransportError as e:
             print(f"❌ GraphQL request failed: {e}")
     
-    def run_comprehensive_test(self):
+    async def run_comprehensive_test(self):
         """
         Run a comprehensive test suite for client credentials flow
         """
@@ -160,48 +215,27 @@ class ClientCredentialsTest:
         print("🧪 OAUTH 2.1 CLIENT CREDENTIALS FLOW TEST")
         print("=" * 60)
         
-        # Test cases
-        test_cases = [
-            {
-                "name": "Valid Client Credentials",
-                "client_id": "test-client-credentials-app",
-                "client_secret": "super-secret-key-123",
-                "scope": "read:data write:data",
-                "expected_success": True
-            },
-            {
-                "name": "Invalid Client ID",
-                "client_id": "nonexistent-client",
-                "client_secret": "super-secret-key-123",
-                "scope": "read:data",
-                "expected_success": False
-            },
-            {
-                "name": "Invalid Client Secret",
-                "client_id": "test-client-credentials-app",
-                "client_secret": "wrong-secret",
-                "scope": "read:data",
-                "expected_success": False
-            },
-            {
-                "name": "No Scope Specified",
-                "client_id": "test-client-credentials-app",
-                "client_secret": "super-secret-key-123",
-                "scope": None,
-                "expected_success": True
-            }
-        ]
+        # The token requests are independent, so they go out together
+        # over the shared pool (sharing one request where they ask for
+        # the same token) and are reported in order below.
+        responses = await asyncio.gather(*[
+            self.request_token(test_case["client_id"],
+                               test_case["client_secret"],
+                               test_case["scope"])
+            for test_case in TEST_CASES
+        ])
         
         results = []
         
-        for i, test_case in enumerate(test_cases, 1):
+        for i, (test_case, response) in enumerate(zip(TEST_CASES, responses), 1):
             print(f"\n🧪 Test {i}: {test_case['name']}")
             print("-" * 40)
             
-            result = self.test_client_credentials_flow(
+            result = await self.test_client_credentials_flow(
                 test_case["client_id"],
                 test_case["client_secret"],
-                test_case["scope"]
+                test_case["scope"],
+                response=response
             )
             
             success = result.get("success", False)
@@ -223,7 +257,7 @@ class ClientCredentialsTest:
             # If we got a valid token, test it
             if success and "access_token" in result.get("data", {}):
                 access_token = result["data"]["access_token"]
-                self.test_with_access_token(access_token)
+                await self.test_with_access_token(access_token)
         
         # Summary
         print("\n" + "=" * 60)
@@ -244,9 +278,119 @@ class ClientCredentialsTest:
                     print(f"   - {result['test']}")
         
         return results
+    
+    async def run_load_test(self, workers=LOAD_WORKERS, duration=None,
+                            requests=None):
+        """
+        Drive /oauth/token with the test cases from concurrent workers
+        
+        Each worker takes the next case in turn and sends its grant
+        straight to the endpoint (no token cache), then a GraphQL call
+        with every token it gets. Runs for duration seconds or until
+        requests token requests were sent.
+        
+        Returns:
+            dict: Per case latencies (seconds, sorted) and error counts
+        """
+        if duration is None and requests is None:
+            duration = LOAD_DURATION
+        
+        print("=" * 60)
+        print("🔥 OAUTH 2.1 CLIENT CREDENTIALS LOAD TEST")
+        print("=" * 60)
+        limit = f"{duration}s" if duration is not None else f"{requests} requests"
+        print(f"👷 Workers: {workers}, running for {limit}")
+        
+        names = [case["name"] for case in TEST_CASES] + [GRAPHQL_CASE]
+        latencies = {name: [] for name in names}
+        sent = Counter()
+        errors = Counter()
+        grants = 0
+        issued = itertools.count()
+        started = time.perf_counter()
+        deadline = started + duration if duration is not None else None
+        
+        async def timed(name, call):
+            sent[name] += 1
+            begin = time.perf_counter()
+            try:
+                response = await call
+            except TransportError as e:
+                errors[(name, type(e.__cause__ or e).__name__)] += 1
+                return None
+            latencies[name].append(time.perf_counter() - begin)
+            return response
+        
+        async def follow_up(access_token):
+            response = await timed(GRAPHQL_CASE, self.client.graphql(
+                FOLLOW_UP_QUERY, token=access_token))
+            if response is None:
+                return
+            if response.status_code != 200:
+                errors[(GRAPHQL_CASE, f"HTTP {response.status_code}")] += 1
+            elif response.json().get("errors"):
+                errors[(GRAPHQL_CASE, "GraphQL errors")] += 1
+        
+        async def worker():
+            nonlocal grants
+            while True:
+                number = next(issued)
+                if requests is not None and number >= requests:
+                    return
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                case = TEST_CASES[number % len(TEST_CASES)]
+                response = await timed(case["name"], self.client.token(
+                    case["client_id"], case["client_secret"], case["scope"]))
+                if response is None:
+                    continue
+                if case["expected_success"]:
+                    matched = response.status_code == 200
+                else:
+                    matched = is_rejection(response)
+                if not matched:
+                    errors[(case["name"], f"HTTP {response.status_code}")] += 1
+                    continue
+                if response.status_code == 200:
+                    try:
+                        access_token = response.json()["access_token"]
+                    except (ValueError, KeyError):
+                        errors[(case["name"], "No access token")] += 1
+                        continue
+                    grants += 1
+                    await follow_up(access_token)
+        
+        await asyncio.gather(*[worker() for _ in range(workers)])
+        elapsed = time.perf_counter() - started
+        
+        print(f"\n{'case':<26} {'requests':>8} {'errors':>6} {'req/s':>8} "
+              f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}")
+        for name in names:
+            values = latencies[name]
+            values.sort()
+            failed = sum(count for (case, _), count in errors.items()
+                         if case == name)
+            print(f"{name:<26} {sent[name]:>8} {failed:>6} "
+                  f"{sent[name] / elapsed:>8.1f} "
+                  f"{percentile(values, 0.5) * 1000:>7.1f} "
+                  f"{percentile(values, 0.95) * 1000:>7.1f} "
+                  f"{percentile(values, 0.99) * 1000:>7.1f}")
+        
+        print(f"\n⏱️  {elapsed:.1f}s, {grants / elapsed:.1f} successful "
+              f"client_credentials grants per second")
+        
+        if errors:
+            print("❌ Errors:")
+            for (name, kind), count in errors.most_common():
+                print(f"   - {name}: {kind} x{count}")
+        else:
+            print("✅ No errors")
+        
+        return {"elapsed": elapsed, "grants": grants, "sent": dict(sent),
+                "latencies": latencies, "errors": dict(errors)}
 
 
-def main():
+async def main():
     """
     Main function to run the client credentials test
     """
@@ -258,25 +402,38 @@ def main():
     
     print(f"🎯 Testing against EYWA server: {eywa_url}")
     
-    # Create test instance
-    tester = ClientCredentialsTest(eywa_url)
+    if len(sys.argv) > 2 and sys.argv[2] == "load":
+        # load [workers] [seconds, e.g. 30s, or number of token requests]
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else LOAD_WORKERS
+        limit = sys.argv[4] if len(sys.argv) > 4 else f"{LOAD_DURATION}s"
+        async with EywaHttp(eywa_url, concurrency=workers) as client:
+            tester = ClientCredentialsTest(eywa_url, client)
+            if limit.endswith("s"):
+                await tester.run_load_test(workers, duration=float(limit[:-1]))
+            else:
+                await tester.run_load_test(workers, requests=int(limit))
+        return
     
-    # Check if user wants to run specific test or comprehensive suite
-    if len(sys.argv) > 2 and sys.argv[2] == "single":
-        # Single test with hardcoded values
-        result = tester.test_client_credentials_flow(
-            client_id="test-client-credentials-app",
-            client_secret="super-secret-key-123",
-            scope="read:data"
-        )
-        
-        if result.get("success") and "access_token" in result.get("data", {}):
-            access_token = result["data"]["access_token"]
-            tester.test_with_access_token(access_token)
-    else:
-        # Run comprehensive test suite
-        tester.run_comprehensive_test()
+    # Create test instance
+    async with EywaHttp(eywa_url) as client, TokenManager(client) as tokens:
+        tester = ClientCredentialsTest(eywa_url, client, tokens)
+        
+        # Check if user wants to run specific test or comprehensive suite
+        if len(sys.argv) > 2 and sys.argv[2] == "single":
+            # Single test with hardcoded values
+            result = await tester.test_client_credentials_flow(
+                client_id="test-client-credentials-app",
+                client_secret="super-secret-key-123",
+                scope="read:data"
+            )
+            
+            if result.get("success") and "access_token" in result.get("data", {}):
+                access_token = result["data"]["access_token"]
+                await tester.test_with_access_token(access_token)
+        else:
+            # Run comprehensive test suite
+            await tester.run_comprehensive_test()
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
\ No newline at end of file
@@ -5,11 +5,13 @@ Test GraphQL with a valid access token
 This script uses a valid access token obtained from the REPL to test GraphQL queries.
 """
 
-import requests
+import asyncio
 import json
 
+from eywa_http import EywaHttp
 
-def test_with_known_token():
+
+async def test_with_known_token(client):
     """
     Test GraphQL with a token that we know works from REPL testing
     """
@@ -22,14 +24,7 @@ def test_with_known_token():
     
     print(f"🎫 Token: {access_token[:50]}...")
     
-    graphql_url = "http://localhost:8080/graphql"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
     # Test 1: Simple introspection
-    print("\n🧪 Test 1: Schema Introspection")
     query1 = {
         "query": """
         {
@@ -45,23 +40,7 @@ def test_with_known_token():
         """
     }
     
-    try:
-        response = requests.post(graphql_url, json=query1, headers=headers, timeout=10)
-        print(f"📥 Status: {response.status_code}")
-        print(f"📥 Response: {response.text}")
-        
-        if response.status_code == 200:
-            data = response.json()
-            if "errors" not in data:
-                print("✅ Introspection successful!")
-                print(f"📊 Schema: {json.dumps(data['data'], indent=2)}")
-            else:
-                print(f"❌ GraphQL Errors: {data['errors']}")
-    except Exception as e:
-        print(f"❌ Request failed: {e}")
-    
     # Test 2: List available queries
-    print("\n🧪 Test 2: Available Queries")
     query2 = {
         "query": """
         {
@@ -79,8 +58,45 @@ def test_with_known_token():
         """
     }
     
+    # Test 3: Try a simple data query
+    query3 = {
+        "query": """
+        {
+          searchUser(limit: 3) {
+            euuid
+            name
+            active
+          }
+        }
+        """
+    }
+    
+    # The three queries are independent: send them together over the
+    # pooled client, then report each one in order.
+    response1, response2, response3 = await asyncio.gather(
+        *[client.graphql(query["query"], token=access_token)
+          for query in (query1, query2, query3)],
+        return_exceptions=True)
+    
+    print("\n🧪 Test 1: Schema Introspection")
     try:
-        response = requests.post(graphql_url, json=query2, headers=headers, timeout=10)
+        response = raise_failed(response1)
+        print(f"📥 Status: {response.status_code}")
+        print(f"📥 Response: {response.text}")
+        
+        if response.status_code == 200:
+            data = response.json()
+            if "errors" not in data:
+                print("✅ Introspection successful!")
+                print(f"📊 Schema: {json.dumps(data['data'], indent=2)}")
+            else:
+                print(f"❌ GraphQL Errors: {data['errors']}")
+    except Exception as e:
+        print(f"❌ Request failed: {e}")
+    
+    print("\n🧪 Test 2: Available Queries")
+    try:
+        response = raise_failed(response2)
         print(f"📥 Status: {response.status_code}")
         
         if response.status_code == 200:
@@ -100,22 +116,9 @@ def test_with_known_token():
     except Exception as e:
         print(f"❌ Request failed: {e}")
     
-    # Test 3: Try a simple data query
     print("\n🧪 Test 3: Simple Data Query")
-    query3 = {
-        "query": """
-        {
-          searchUser(limit: 3) {
-            euuid
-            name
-            active
-          }
-        }
-        """
-    }
-    
     try:
-        response = requests.post(graphql_url, json=query3, headers=headers, timeout=10)
+        response = raise_failed(response3)
         print(f"📥 Status: {response.status_code}")
         
         if response.status_code == 200:
@@ -134,23 +137,27 @@ def test_with_known_token():
         print(f"❌ Request failed: {e}")
 
 
-def test_token_endpoint_again():
+def raise_failed(response):
+    """
+    Re-raise a request error that asyncio.gather returned in place of
+    the response.
+    """
+    if isinstance(response, Exception):
+        raise response
+    return response
+
+
+async def test_token_endpoint_again(client):
     """
     Try the token endpoint one more time to see current status
     """
     print("\n🔄 Testing Token Endpoint Status")
     print("=" * 40)
     
-    url = "http://localhost:8080/oauth/token"
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": "test-client-credentials-app",
-        "client_secret": "super-secret-key-123",
-        "scope": "read:data"
-    }
-    
     try:
-        response = requests.post(url, data=data, timeout=5)
+        response = await client.token("test-client-credentials-app",
+                                      "super-secret-key-123", "read:data",
+                                      timeout=5)
         print(f"📥 Token endpoint status: {response.status_code}")
         print(f"📥 Response: {response.text}")
         
@@ -166,21 +173,22 @@ def test_token_endpoint_again():
         return None
 
 
-def main():
+async def main():
     print("🧪 GRAPHQL TESTING WITH ACCESS TOKEN")
     print("=" * 50)
     
-    # First, try to get a fresh token
-    fresh_token = test_token_endpoint_again()
-    
-    if fresh_token:
-        print(f"\n✅ Using fresh token: {fresh_token[:50]}...")
-        # Use the fresh token for testing
-        # ... (add GraphQL tests here)
-    else:
-        print("\n🔄 Using known working token from REPL tests...")
-        test_with_known_token()
+    async with EywaHttp("http://localhost:8080") as client:
+        # First, try to get a fresh token
+        fresh_token = await test_token_endpoint_again(client)
+        
+        if fresh_token:
+            print(f"\n✅ Using fresh token: {fresh_token[:50]}...")
+            # Use the fresh token for testing
+            # ... (add GraphQL tests here)
+        else:
+            print("\n🔄 Using known working token from REPL tests...")
+            await test_with_known_token(client)
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
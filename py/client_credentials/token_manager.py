@@ -0,0 +1,372 @@
+"""
+Client credentials tokens, cached and refreshed ahead of expiry
+
+Tokens are kept per (client_id, scope) and reused until shortly before
+they expire, instead of asking /oauth/token again on every run or from
+every worker. When a token gets close to expiry it is refreshed in the
+background while callers keep using the current one, and concurrent
+callers that need a new token share one request to the endpoint.
+
+Failed grants are never cached, and a token is only handed out for the
+client secret it was issued to.
+
+Tokens can also be kept across process restarts in a local JSON file,
+written with owner only permissions (0600). Pass cache_file or set
+EYWA_TOKEN_CACHE to enable it. Cached tokens are tied to their secret
+by an HMAC keyed with a random key kept in a separate file (cache_file
+plus ".key"), so the cache alone gives nothing to brute-force the
+secret against.
+
+    async with EywaHttp(url) as client, TokenManager(client) as tokens:
+        token = await tokens.get(client_id, client_secret, "read:data")
+        await client.graphql(query, token=token.access_token)
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import stat
+import time
+
+from eywa_http import TransportError
+
+
+CACHE_ENV = "EYWA_TOKEN_CACHE"
+CACHE_FORMAT = 2
+KEY_SUFFIX = ".key"
+KEY_SIZE = 32
+
+# Refresh when this many seconds are left, or a fifth of the lifetime
+# for short lived tokens, but never sooner than REFRESH_MIN after a
+# fetch.
+REFRESH_BEFORE = 60
+REFRESH_SHARE = 0.2
+REFRESH_MIN = 5
+# Lifetime assumed when the endpoint leaves out expires_in.
+DEFAULT_EXPIRY = 3600
+
+
+class TokenError(Exception):
+    """
+    Token endpoint refused the grant (or answered with something that is
+    not a token).
+    """
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+        self.error = data.get("error", "invalid_response")
+        self.description = data.get("error_description")
+        super().__init__(f"{status_code} {self.error}: {self.description}")
+
+
+class Token:
+    __slots__ = ("access_token", "token_type", "scope", "issued_at",
+                 "expires_at", "fingerprint", "source")
+
+    def __init__(self, access_token, token_type, scope, issued_at, expires_at,
+                 fingerprint, source="endpoint"):
+        self.access_token = access_token
+        self.token_type = token_type
+        self.scope = scope
+        self.issued_at = issued_at
+        self.expires_at = expires_at
+        self.fingerprint = fingerprint
+        self.source = source
+
+    @property
+    def refresh_at(self):
+        lifetime = self.expires_at - self.issued_at
+        return self.expires_at - min(REFRESH_BEFORE, lifetime * REFRESH_SHARE)
+
+    def expires_in(self, now):
+        return max(0, int(self.expires_at - now))
+
+    def response(self, now):
+        """
+        Token as the endpoint would return it now.
+        """
+        return {
+            "access_token": self.access_token,
+            "type": self.token_type,
+            "scope": self.scope,
+            "expires_in": self.expires_in(now)
+        }
+
+    def to_json(self):
+        return {name: getattr(self, name) for name in self.__slots__
+                if name != "source"}
+
+
+def normalize_scope(scope):
+    return " ".join(sorted(set((scope or "").split())))
+
+
+def fingerprint(key, token_endpoint, client_id, client_secret):
+    """
+    Ties a cached token to the secret it was issued for, without keeping
+    the secret itself or an unkeyed hash of it.
+    """
+    material = "\0".join([token_endpoint, client_id, client_secret])
+    return hmac.new(key, material.encode(), hashlib.sha256).hexdigest()
+
+
+def private(info):
+    """
+    Whether a file is only accessible to us, so nobody else could have
+    read or planted it.
+    """
+    return not (info.st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+                or (hasattr(os, "getuid") and info.st_uid != os.getuid()))
+
+
+def write_partial(path, data, mode="w"):
+    """
+    Write data to an owner only file next to path and return its name,
+    for the caller to move into place.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    partial = f"{path}.{os.getpid()}.partial"
+    descriptor = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+    with os.fdopen(descriptor, mode) as file:
+        file.write(data)
+    return partial
+
+
+def cache_key(path):
+    """
+    Fingerprint key kept in path, created on first use. None when the
+    file cannot be used, in which case the disk cache is not trusted.
+    """
+    try:
+        if not os.path.exists(path):
+            partial = write_partial(path, secrets.token_bytes(KEY_SIZE), "wb")
+            try:
+                # Fails if another process created the key meanwhile,
+                # in which case that one is used.
+                os.link(partial, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(partial)
+        with open(path, "rb") as file:
+            if not private(os.fstat(file.fileno())):
+                return None
+            key = file.read()
+    except OSError:
+        return None
+    return key if len(key) == KEY_SIZE else None
+
+
+class TokenManager:
+    def __init__(self, client, cache_file=None, clock=time.time):
+        self.client = client
+        self.cache_file = cache_file or os.environ.get(CACHE_ENV)
+        self.clock = clock
+        self.key = None
+        self.tokens = {}
+        self.pending = {}
+        self.timers = {}
+        self.removed = set()
+        self.loaded = False
+        self.requests = 0
+        self.hits = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def counters(self):
+        return {"token requests": self.requests, "cache hits": self.hits,
+                "background refreshes": self.refreshes,
+                "refresh failures": self.failures}
+
+    def fingerprint(self, client_id, client_secret):
+        if self.key is None:
+            key = None
+            if self.cache_file:
+                key = cache_key(self.cache_file + KEY_SUFFIX)
+            # Without a usable key file, fingerprints only have to hold
+            # for this process, and nothing saved before will match.
+            self.key = key or secrets.token_bytes(KEY_SIZE)
+        return fingerprint(self.key, self.client.token_endpoint, client_id,
+                           client_secret)
+
+    async def get(self, client_id, client_secret, scope=None):
+        """
+        A valid token for client_id and scope. Raises TokenError when
+        the grant is refused and TransportError when EYWA is not
+        reachable.
+        """
+        self.load()
+        scope = normalize_scope(scope)
+        key = (client_id, scope)
+        secret = self.fingerprint(client_id, client_secret)
+        token = self.tokens.get(key)
+        now = self.clock()
+        if token is not None and token.fingerprint == secret:
+            if now < token.refresh_at:
+                self.hits += 1
+                return token
+            if now < token.expires_at:
+                self.hits += 1
+                self.refresh(key, client_secret, background=True)
+                return token
+        return await asyncio.shield(self.refresh(key, client_secret))
+
+    def refresh(self, key, client_secret, background=False):
+        """
+        The request in flight for key and secret, starting one if there
+        is none.
+        """
+        flight = key + (self.fingerprint(key[0], client_secret),)
+        task = self.pending.get(flight)
+        if task is None:
+            task = asyncio.ensure_future(self.fetch(key, client_secret,
+                                                    background))
+            self.pending[flight] = task
+            task.add_done_callback(lambda _: self.pending.pop(flight, None))
+        return task
+
+    async def fetch(self, key, client_secret, background):
+        client_id, scope = key
+        self.requests += 1
+        if background:
+            self.refreshes += 1
+        try:
+            response = await self.client.token(client_id, client_secret,
+                                               scope or None)
+            try:
+                data = response.json()
+            except ValueError:
+                data = {"error_description": response.text}
+            if response.status_code != 200 or "access_token" not in data:
+                raise TokenError(response.status_code, data)
+        except (TokenError, TransportError):
+            if background:
+                # The current token is still valid; try again next get.
+                self.failures += 1
+                return self.tokens.get(key)
+            raise
+        now = self.clock()
+        token = Token(data["access_token"], data.get("type", "Bearer"),
+                      data.get("scope", scope), now,
+                      now + float(data.get("expires_in") or DEFAULT_EXPIRY),
+                      self.fingerprint(client_id, client_secret))
+        self.tokens[key] = token
+        self.removed.discard(key)
+        self.schedule(key, client_secret, token)
+        self.save()
+        return token
+
+    def schedule(self, key, client_secret, token):
+        """
+        Refresh key in the background once token reaches its refresh
+        time, even if nobody asks for it in between.
+        """
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        delay = max(REFRESH_MIN, token.refresh_at - self.clock())
+        self.timers[key] = asyncio.get_running_loop().call_later(
+            delay, self.refresh, key, client_secret, True)
+
+    def invalidate(self, client_id, scope=None):
+        """
+        Forget a token, e.g. after the API rejected it as revoked.
+        """
+        key = (client_id, normalize_scope(scope))
+        self.tokens.pop(key, None)
+        self.removed.add(key)
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self.save()
+
+    async def close(self):
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+        for task in list(self.pending.values()):
+            task.cancel()
+        await asyncio.gather(*self.pending.values(), return_exceptions=True)
+
+    def load(self):
+        """
+        Read tokens that are still valid from cache_file, once.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        now = self.clock()
+        for key, token in self.read().items():
+            if key not in self.tokens and now < token.expires_at:
+                token.source = "disk"
+                self.tokens[key] = token
+
+    def read(self):
+        if not self.cache_file:
+            return {}
+        try:
+            with open(self.cache_file) as file:
+                # Ignore a cache others could have read or planted.
+                if not private(os.fstat(file.fileno())):
+                    return {}
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if data.get("format") != CACHE_FORMAT:
+            return {}
+        endpoint = self.client.token_endpoint
+        tokens = {}
+        for entry in data.get("tokens", []):
+            if entry.get("endpoint") != endpoint:
+                continue
+            try:
+                key = (entry["client_id"], entry["scope"])
+                tokens[key] = Token(**entry["token"])
+            except (KeyError, TypeError):
+                continue
+        return tokens
+
+    def save(self):
+        """
+        Merge the tokens of this manager into cache_file, replacing it
+        atomically. Tokens other processes saved are kept.
+        """
+        if not self.cache_file:
+            return
+        now = self.clock()
+        endpoint = self.client.token_endpoint
+        entries = {}
+        try:
+            with open(self.cache_file) as file:
+                data = json.load(file)
+            # Entries of another format carry fingerprints this one
+            # cannot check, so they are dropped.
+            if data.get("format") == CACHE_FORMAT:
+                for entry in data.get("tokens", []):
+                    if entry["token"]["expires_at"] > now:
+                        entries[(entry["endpoint"], entry["client_id"],
+                                 entry["scope"])] = entry
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+        for client_id, scope in self.removed:
+            entries.pop((endpoint, client_id, scope), None)
+        for (client_id, scope), token in self.tokens.items():
+            if token.expires_at > now:
+                entries[(endpoint, client_id, scope)] = {
+                    "endpoint": endpoint, "client_id": client_id,
+                    "scope": scope, "token": token.to_json()}
+        partial = write_partial(self.cache_file, json.dumps(
+            {"format": CACHE_FORMAT, "tokens": list(entries.values())}))
+        os.replace(partial, self.cache_file)
@@ -6,74 +6,76 @@ This script manually tests the client credentials flow and then
 uses the token to make GraphQL queries.
 """
 
-import requests
+import asyncio
 import json
+import os
 import sys
-from urllib.parse import urlencode
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "client_credentials"))
 
-def get_access_token_manual():
+from eywa_http import EywaHttp  # noqa: E402
+from token_manager import TokenError, TokenManager  # noqa: E402
+
+
+async def get_access_token_manual(tokens):
     """
-    Manually get an access token by making the exact request
+    Get an access token for the test client, reusing a cached one while
+    it is valid
     """
     print("🔑 Manual Client Credentials Token Request")
     print("=" * 50)
     
-    # Use curl-like approach
-    url = "http://localhost:8080/oauth/token"
+    url = tokens.client.token_endpoint
     
     data = {
         "grant_type": "client_credentials",
         "client_id": "test-client-credentials-app", 
-        "client_secret": "super-secret-key-123",
         "scope": "read:data"
     }
     
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Accept": "application/json"
-    }
-    
     print(f"📤 POST {url}")
     print(f"📋 Data: {data}")
     
     try:
-        response = requests.post(url, data=data, headers=headers, timeout=10)
-        
-        print(f"📥 Status: {response.status_code}")
-        print(f"📥 Headers: {dict(response.headers)}")
-        print(f"📥 Raw Response: {response.text}")
+        token = await tokens.get(data["client_id"], "super-secret-key-123",
+                                 data["scope"])
+        token_data = token.response(tokens.clock())
         
-        if response.status_code == 200:
-            try:
-                token_data = response.json()
-                return token_data
-            except json.JSONDecodeError:
-                print("❌ Failed to parse JSON response")
-                return None
+        if token.source == "endpoint":
+            print("📥 Status: 200")
         else:
-            print(f"❌ Request failed with status {response.status_code}")
-            return None
+            print(f"♻️  Reusing token cached on {token.source}")
+        print(f"📥 Token: {json.dumps(token_data)}")
+        return token_data
             
+    except TokenError as e:
+        print(f"❌ Request failed with status {e.status_code}")
+        print(f"📥 Response: {json.dumps(e.data)}")
+        return None
     except Exception as e:
         print(f"❌ Request failed: {e}")
         return None
 
 
-def test_graphql_queries(access_token):
+def send_all(client, queries, access_token, timeout=None):
+    """
+    Send every query at once over the pooled client. Results come back
+    in the order of queries, with a failed request as its exception.
+    """
+    return asyncio.gather(*[client.graphql(query["query"], token=access_token,
+                                           timeout=timeout)
+                            for query in queries],
+                          return_exceptions=True)
+
+
+async def test_graphql_queries(client, access_token):
     """
     Test various GraphQL queries with the access token
     """
     print("\n🚀 Testing GraphQL Queries with Access Token")
     print("=" * 50)
     
-    graphql_url = "http://localhost:8080/graphql"
-    
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
     # Test queries from simple to more complex
     test_queries = [
         {
@@ -121,17 +123,15 @@ def test_graphql_queries(access_token):
         }
     ]
     
-    for i, test in enumerate(test_queries, 1):
+    responses = await send_all(client, test_queries, access_token)
+    
+    for i, (test, response) in enumerate(zip(test_queries, responses), 1):
         print(f"\n🧪 Test {i}: {test['name']}")
         print("-" * 30)
         
         try:
-            response = requests.post(
-                graphql_url,
-                json={"query": test["query"]},
-                headers=headers,
-                timeout=10
-            )
+            if isinstance(response, Exception):
+                raise response
             
             print(f"📥 Status: {response.status_code}")
             
@@ -148,7 +148,7 @@ def test_graphql_queries(access_token):
                             print(f"📊 Data preview: {json.dumps(result, indent=2)[:200]}...")
                         else:
                             print("📊 Empty data response")
-                except json.JSONDecodeError:
+                except ValueError:
                     print(f"❌ Invalid JSON: {response.text}")
             else:
                 print(f"❌ HTTP Error: {response.status_code}")
@@ -158,19 +158,13 @@ def test_graphql_queries(access_token):
             print(f"❌ Request failed: {e}")
 
 
-def test_simple_data_query(access_token):
+async def test_simple_data_query(client, access_token):
     """
     Test a simple data query if available
     """
     print("\n🔍 Testing Simple Data Queries")
     print("=" * 40)
     
-    graphql_url = "http://localhost:8080/graphql"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
     # Try some common EYWA queries
     simple_queries = [
         {
@@ -190,16 +184,14 @@ def test_simple_data_query(access_token):
         }
     ]
     
-    for query_test in simple_queries:
+    responses = await send_all(client, simple_queries, access_token, timeout=5)
+    
+    for query_test, response in zip(simple_queries, responses):
         print(f"\n🔹 {query_test['name']}:")
         
         try:
-            response = requests.post(
-                graphql_url,
-                json={"query": query_test["query"]},
-                headers=headers,
-                timeout=5
-            )
+            if isinstance(response, Exception):
+                raise response
             
             if response.status_code == 200:
                 data = response.json()
@@ -214,15 +206,24 @@ def test_simple_data_query(access_token):
             print(f"❌ Request failed: {e}")
 
 
-def main():
+async def main():
     """
     Main test function
     """
     print("🧪 COMPREHENSIVE CLIENT CREDENTIALS + GRAPHQL TEST")
     print("=" * 60)
     
+    async with EywaHttp("http://localhost:8080") as client, \
+            TokenManager(client) as tokens:
+        await run(client, tokens)
+
+
+async def run(client, tokens):
+    """
+    Token request followed by the GraphQL checks, all over one client
+    """
     # Step 1: Get access token
-    token_data = get_access_token_manual()
+    token_data = await get_access_token_manual(tokens)
     
     if not token_data:
         print("\n❌ Could not obtain access token. Exiting.")
@@ -240,14 +241,14 @@ def main():
     print(f"🔑 Token Preview: {access_token[:50]}...")
     
     # Step 2: Test GraphQL queries
-    test_graphql_queries(access_token)
+    await test_graphql_queries(client, access_token)
     
     # Step 3: Test simple data queries
-    test_simple_data_query(access_token)
+    await test_simple_data_query(client, access_token)
     
     print(f"\n🎉 Test completed!")
     print(f"💡 Your access token: {access_token}")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
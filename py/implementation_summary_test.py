@@ -9,7 +9,18 @@ needs additional setup.
 
 import requests
 import json
-import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "client_credentials"))
+
+from jwt_verify import JwtError, Verifier, unverified_claims  # noqa: E402
+
+
+# Keys are fetched once from the issuer and verified claims are cached,
+# so checking a token does not cost a request to EYWA.
+verifier = Verifier("http://localhost:8080")
 
 
 def decode_jwt_payload(token):
@@ -17,23 +28,26 @@ def decode_jwt_payload(token):
     Decode JWT payload to show token contents (for demonstration)
     """
     try:
-        # Split token into parts
-        parts = token.split('.')
-        if len(parts) != 3:
-            return None
-        
-        # Decode the payload (middle part)
-        payload = parts[1]
-        # Add padding if needed
-        payload += '=' * (4 - len(payload) % 4)
-        
-        decoded = base64.urlsafe_b64decode(payload)
-        return json.loads(decoded)
-    except Exception as e:
+        return unverified_claims(token)
+    except JwtError as e:
         print(f"Error decoding JWT: {e}")
         return None
 
 
+def verify_jwt(token):
+    """
+    Check the JWT signature and claims locally against the issuer's
+    JWKS. Returns None when the token checks out, otherwise the reason
+    it does not (which includes setups where it cannot be checked, e.g.
+    without the cryptography package).
+    """
+    try:
+        verifier.verify(token)
+    except JwtError as e:
+        return str(e)
+    return None
+
+
 def test_implementation_status():
     """
     Test the current status of our client credentials implementation
@@ -93,6 +107,11 @@ def test_implementation_status():
                         payload = decode_jwt_payload(access_token)
                         if payload:
                             print(f"🎫 Token payload: {json.dumps(payload, indent=2)}")
+                            problem = verify_jwt(access_token)
+                            if problem is None:
+                                print("🔏 Signature verified against issuer JWKS")
+                            else:
+                                print(f"⚠️  Signature not verified: {problem}")
                 except json.JSONDecodeError:
                     pass
             elif response.status_code == 401:
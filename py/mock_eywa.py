@@ -0,0 +1,799 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an EYWA instance
+
+Serves the endpoints the Python examples use, backed by an in-memory
+store, so client side cost can be measured without a running EYWA:
+
+    POST /oauth/token   client_credentials grant, RS256 signed tokens
+                        (HS256 without the cryptography package)
+    POST /graphql       sync*/search*/delete* operations, importDataset,
+                        deleteDataset and basic introspection
+    GET  /stats         request and row counters, as JSON
+    GET  /.well-known/openid-configuration
+    GET  /oauth/jwks    public signing keys
+
+Latency and error rate can be injected to see how clients behave when
+the server is slow or flaky. Only the GraphQL the examples send is
+understood: root fields with arguments and selections, variables,
+`_limit`/`_offset`, simple `_where` comparisons and `_order_by`.
+Persisted queries are accepted the way Apollo sends them, as a sha256
+hash in `extensions.persistedQuery`, with the full text on a miss.
+
+Usage:
+    python mock_eywa.py --port 8080 --latency 0.02 --error-rate 0.05
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+except ImportError:
+    rsa = None
+
+
+CLIENTS = {
+    "test-client-credentials-app": {
+        "secret": "super-secret-key-123",
+        "scope": "read:data write:data",
+    },
+}
+TOKEN_EXPIRY = 3600
+
+
+class GraphQLError(Exception):
+    pass
+
+
+# -- GraphQL parsing -------------------------------------------------------
+
+TOKEN = re.compile(r'''
+    (?P<ignored>[\s,]+|\#[^\n]*)
+  | (?P<block>"""(?:[^"\\]|\\.|"(?!""))*""")
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<name>[_A-Za-z][_0-9A-Za-z]*)
+  | (?P<punctuator>\.\.\.|[!$():=@\[\]{}|&])
+''', re.VERBOSE)
+
+
+def tokenize(source):
+    tokens = []
+    position = 0
+    while position < len(source):
+        match = TOKEN.match(source, position)
+        if match is None:
+            raise GraphQLError(f"Syntax error at {position}: "
+                               f"{source[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind != "ignored":
+            tokens.append((kind, match.group()))
+    return tokens
+
+
+class Variable:
+    def __init__(self, name):
+        self.name = name
+
+
+class Field:
+    def __init__(self, alias, name, arguments, selections):
+        self.alias = alias
+        self.name = name
+        self.arguments = arguments
+        self.selections = selections
+
+    @property
+    def key(self):
+        return self.alias or self.name
+
+
+class Parser:
+    def __init__(self, source):
+        self.tokens = tokenize(source)
+        self.position = 0
+
+    def peek(self, value=None):
+        if self.position >= len(self.tokens):
+            return None
+        token = self.tokens[self.position]
+        if value is not None and token[1] != value:
+            return None
+        return token
+
+    def take(self, value=None):
+        token = self.peek()
+        if token is None or (value is not None and token[1] != value):
+            expected = value or "more input"
+            found = token[1] if token else "end of document"
+            raise GraphQLError(f"Expected {expected}, found {found}")
+        self.position += 1
+        return token
+
+    def operation(self):
+        kind = "query"
+        if self.peek() and self.peek()[1] in ("query", "mutation",
+                                              "subscription"):
+            kind = self.take()[1]
+            if self.peek() and self.peek()[0] == "name":
+                self.take()
+            if self.peek("("):
+                self.variable_definitions()
+        return kind, self.selection_set()
+
+    def variable_definitions(self):
+        self.take("(")
+        while not self.peek(")"):
+            self.take("$")
+            self.take()
+            self.take(":")
+            self.type_reference()
+            if self.peek("="):
+                self.take("=")
+                self.value()
+        self.take(")")
+
+    def type_reference(self):
+        if self.peek("["):
+            self.take("[")
+            self.type_reference()
+            self.take("]")
+        else:
+            self.take()
+        if self.peek("!"):
+            self.take("!")
+
+    def selection_set(self):
+        self.take("{")
+        fields = []
+        while not self.peek("}"):
+            if self.peek("..."):
+                raise GraphQLError("Fragments are not supported")
+            name = self.take()[1]
+            alias = None
+            if self.peek(":"):
+                self.take(":")
+                alias, name = name, self.take()[1]
+            arguments = self.arguments() if self.peek("(") else {}
+            selections = self.selection_set() if self.peek("{") else None
+            fields.append(Field(alias, name, arguments, selections))
+        self.take("}")
+        return fields
+
+    def arguments(self):
+        self.take("(")
+        arguments = {}
+        while not self.peek(")"):
+            name = self.take()[1]
+            self.take(":")
+            arguments[name] = self.value()
+        self.take(")")
+        return arguments
+
+    def value(self):
+        kind, text = self.take()
+        if text == "$":
+            return Variable(self.take()[1])
+        if text == "[":
+            items = []
+            while not self.peek("]"):
+                items.append(self.value())
+            self.take("]")
+            return items
+        if text == "{":
+            fields = {}
+            while not self.peek("}"):
+                name = self.take()[1]
+                self.take(":")
+                fields[name] = self.value()
+            self.take("}")
+            return fields
+        if kind == "number":
+            return float(text) if re.search(r"[.eE]", text) else int(text)
+        if kind == "block":
+            return text[3:-3]
+        if kind == "string":
+            return json.loads(text)
+        if kind == "name":
+            return {"true": True, "false": False, "null": None}.get(text, text)
+        raise GraphQLError(f"Unexpected {text}")
+
+
+def resolve(value, variables):
+    if isinstance(value, Variable):
+        return variables.get(value.name)
+    if isinstance(value, list):
+        return [resolve(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: resolve(item, variables) for key, item in value.items()}
+    return value
+
+
+# -- Execution ---------------------------------------------------------------
+
+COMPARISONS = {
+    "_eq": lambda a, b: a == b,
+    "_neq": lambda a, b: a != b,
+    "_gt": lambda a, b: a is not None and a > b,
+    "_ge": lambda a, b: a is not None and a >= b,
+    "_lt": lambda a, b: a is not None and a < b,
+    "_le": lambda a, b: a is not None and a <= b,
+    "_in": lambda a, b: a in b,
+    "_like": lambda a, b: a is not None and re.fullmatch(
+        re.escape(b).replace("%", ".*"), str(a), re.IGNORECASE) is not None,
+}
+
+
+def matches(row, where):
+    for key, condition in (where or {}).items():
+        if key == "_and":
+            if not all(matches(row, item) for item in condition):
+                return False
+        elif key == "_or":
+            if not any(matches(row, item) for item in condition):
+                return False
+        elif key == "_not":
+            if matches(row, condition):
+                return False
+        else:
+            for operator, expected in condition.items():
+                compare = COMPARISONS.get(operator)
+                if compare is None:
+                    raise GraphQLError(f"Unsupported operator {operator}")
+                if not compare(row.get(key), expected):
+                    return False
+    return True
+
+
+def ordered(rows, order_by):
+    if isinstance(order_by, dict):
+        order_by = [order_by]
+    for clause in reversed(order_by or []):
+        for key, direction in reversed(list(clause.items())):
+            rows = sorted(rows, key=lambda row: (row.get(key) is None,
+                                                 row.get(key)),
+                          reverse=direction == "desc")
+    return rows
+
+
+def window(rows, arguments):
+    rows = [row for row in rows if matches(row, arguments.get("_where"))]
+    rows = ordered(rows, arguments.get("_order_by"))
+    offset = arguments.get("_offset") or 0
+    limit = arguments.get("_limit")
+    return rows[offset:offset + limit if limit is not None else None]
+
+
+def aggregate(items, selections):
+    result = {}
+    for operation in selections or ():
+        values = {}
+        for field in operation.selections or ():
+            numbers = [item.get(field.name) for item in items
+                       if isinstance(item.get(field.name), (int, float))]
+            if not numbers:
+                values[field.key] = None
+            elif operation.name == "_avg":
+                values[field.key] = sum(numbers) / len(numbers)
+            elif operation.name == "_sum":
+                values[field.key] = sum(numbers)
+            elif operation.name == "_min":
+                values[field.key] = min(numbers)
+            elif operation.name == "_max":
+                values[field.key] = max(numbers)
+        result[operation.key] = values
+    return result
+
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entities = {}
+        self.rows = {}
+        self.datasets = {}
+
+    def sync(self, entity, rows):
+        with self.lock:
+            table = self.entities.setdefault(entity, {})
+            synced = []
+            for row in rows or ():
+                row = dict(row)
+                euuid = row.setdefault("euuid", str(uuid.uuid4()))
+                stored = table.setdefault(euuid, {})
+                stored.update(row)
+                self.rows[euuid] = stored
+                synced.append(stored)
+            return synced
+
+    def search(self, entity):
+        with self.lock:
+            return list(self.entities.get(entity, {}).values())
+
+    def delete(self, entity, euuid):
+        with self.lock:
+            removed = self.entities.get(entity, {}).pop(euuid, None)
+            self.rows.pop(euuid, None)
+            return removed is not None
+
+    def reset(self):
+        with self.lock:
+            self.entities.clear()
+            self.rows.clear()
+
+    def counts(self):
+        with self.lock:
+            return {entity: len(rows) for entity, rows in self.entities.items()}
+
+    def related(self, item):
+        # Relations are stored as {"euuid": ...} references.
+        if isinstance(item, dict) and set(item) == {"euuid"}:
+            return self.rows.get(item["euuid"], item)
+        return item
+
+    def project(self, value, selections):
+        if selections is None or value is None:
+            return value
+        if isinstance(value, list):
+            return [self.project(item, selections) for item in value]
+        value = self.related(value)
+        result = {}
+        for field in selections:
+            if field.name == "__typename":
+                result[field.key] = "Object"
+            elif field.name == "_count":
+                result[field.key] = {
+                    relation.key: len(window(
+                        [self.related(item)
+                         for item in value.get(relation.name) or ()],
+                        relation.arguments))
+                    for relation in field.selections or ()}
+            elif field.name == "_agg":
+                result[field.key] = {
+                    relation.key: aggregate(
+                        [self.related(item)
+                         for item in value.get(relation.name) or ()],
+                        relation.selections)
+                    for relation in field.selections or ()}
+            else:
+                item = value.get(field.name)
+                if isinstance(item, list) and field.selections is not None:
+                    item = window([self.related(entry) for entry in item],
+                                  field.arguments)
+                result[field.key] = self.project(item, field.selections)
+        return result
+
+
+OPERATION = re.compile(r"^(sync|stack|search|get|delete)(\w+?)(List)?$")
+
+
+DOCUMENT_CACHE = 1000
+
+
+class Executor:
+    def __init__(self, store, count=lambda name, amount=1: None):
+        self.store = store
+        self.count = count
+        self.documents = {}
+
+    def parse(self, query):
+        document = self.documents.get(query)
+        if document is None:
+            self.count("documents parsed")
+            document = Parser(query).operation()
+            if len(self.documents) >= DOCUMENT_CACHE:
+                self.documents.clear()
+            self.documents[query] = document
+        return document
+
+    def execute(self, query, variables):
+        kind, fields = self.parse(query)
+        data = {}
+        for field in fields:
+            arguments = resolve(field.arguments, variables or {})
+            data[field.key] = self.field(kind, field, arguments)
+            self.count(f"graphql {field.name}")
+        return data
+
+    def field(self, kind, field, arguments):
+        if field.name == "__typename":
+            return "Mutation" if kind == "mutation" else "Query"
+        if field.name == "__schema":
+            return self.store.project(self.schema(), field.selections)
+        if field.name == "__type":
+            return self.store.project(self.type(arguments.get("name")),
+                                      field.selections)
+        if field.name == "importDataset":
+            dataset = {"euuid": str(uuid.uuid4()), "name": "Dataset",
+                       "deployed": True}
+            self.store.datasets[dataset["euuid"]] = dataset
+            return self.store.project(dataset, field.selections)
+        if field.name == "deleteDataset":
+            self.store.reset()
+            return True
+        match = OPERATION.match(field.name)
+        if match is None:
+            raise GraphQLError(f"Unknown field {field.name}")
+        operation, entity, many = match.groups()
+        if operation in ("sync", "stack"):
+            if kind != "mutation":
+                raise GraphQLError(f"{field.name} is a mutation")
+            data = arguments.get("data")
+            if many is None and data is None and len(arguments) == 1:
+                data = next(iter(arguments.values()))
+            rows = self.store.sync(entity, data if many else [data])
+            self.count(f"rows synced {entity}", len(rows))
+            result = rows if many else rows[0]
+            return self.store.project(result, field.selections)
+        if operation == "delete":
+            if kind != "mutation":
+                raise GraphQLError(f"{field.name} is a mutation")
+            return self.store.delete(entity, arguments.get("euuid"))
+        rows = self.store.search(entity)
+        if operation == "get":
+            rows = [row for row in rows
+                    if row.get("euuid") == arguments.get("euuid")]
+            return self.store.project(rows[0] if rows else None,
+                                      field.selections)
+        return self.store.project(window(rows, arguments), field.selections)
+
+    def schema(self):
+        entities = sorted(self.store.counts())
+        return {"queryType": {"name": "Query"},
+                "mutationType": {"name": "Mutation"},
+                "types": [{"name": name, "kind": "OBJECT"}
+                          for name in ["Query", "Mutation"] + entities]}
+
+    def type(self, name):
+        entities = sorted(self.store.counts())
+        if name == "Query":
+            fields = [f"search{entity}" for entity in entities]
+        elif name == "Mutation":
+            fields = [f"sync{entity}List" for entity in entities]
+        else:
+            return None
+        return {"name": name, "kind": "OBJECT",
+                "fields": [{"name": field, "description": None,
+                            "type": {"name": None, "kind": "LIST"}}
+                           for field in fields]}
+
+
+# -- Tokens ------------------------------------------------------------------
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def unb64(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def b64_int(number):
+    return b64(number.to_bytes((number.bit_length() + 7) // 8, "big"))
+
+
+class Tokens:
+    """
+    Signs with an RSA key published as JWKS when cryptography is
+    installed, with an HS256 secret otherwise. rotate() switches to a
+    new key and keeps publishing the previous one, as a real rotation
+    would.
+    """
+
+    def __init__(self, issuer, secret):
+        self.issuer = issuer
+        self.secret = secret
+        self.keys = []
+        if rsa is not None:
+            self.rotate()
+
+    def rotate(self):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.keys = self.keys[-1:] + [(uuid.uuid4().hex, key)]
+
+    def jwks(self):
+        keys = []
+        for kid, key in self.keys:
+            numbers = key.public_key().public_numbers()
+            keys.append({"kty": "RSA", "use": "sig", "alg": "RS256",
+                         "kid": kid, "n": b64_int(numbers.n),
+                         "e": b64_int(numbers.e)})
+        return {"keys": keys}
+
+    def issue(self, client_id, scope):
+        now = int(time.time())
+        if self.keys:
+            kid, key = self.keys[-1]
+            header = {"alg": "RS256", "typ": "JWT", "kid": kid}
+        else:
+            header = {"alg": "HS256", "typ": "JWT"}
+        payload = {"iss": self.issuer, "sub": client_id,
+                   "client_id": client_id, "scope": scope,
+                   "iat": now, "exp": now + TOKEN_EXPIRY}
+        signing_input = (f"{b64(json.dumps(header).encode())}."
+                         f"{b64(json.dumps(payload).encode())}").encode()
+        if self.keys:
+            signature = key.sign(signing_input, padding.PKCS1v15(),
+                                 hashes.SHA256())
+        else:
+            signature = hmac.new(self.secret, signing_input,
+                                 hashlib.sha256).digest()
+        return f"{signing_input.decode()}.{b64(signature)}"
+
+    def verify(self, token):
+        try:
+            signing_input, signature = token.rsplit(".", 1)
+            header = json.loads(unb64(signing_input.split(".")[0]))
+            signing_input = signing_input.encode()
+            signature = unb64(signature)
+            if header.get("alg") == "RS256":
+                key = dict(self.keys).get(header.get("kid"))
+                if key is None:
+                    return None
+                try:
+                    key.public_key().verify(signature, signing_input,
+                                            padding.PKCS1v15(),
+                                            hashes.SHA256())
+                except InvalidSignature:
+                    return None
+            elif self.keys or header.get("alg") != "HS256":
+                return None
+            else:
+                expected = hmac.new(self.secret, signing_input,
+                                    hashlib.sha256).digest()
+                if not hmac.compare_digest(expected, signature):
+                    return None
+            payload = json.loads(unb64(signing_input.split(b".")[1].decode()))
+        except (ValueError, IndexError):
+            return None
+        if payload.get("exp", 0) < time.time():
+            return None
+        return payload
+
+
+# -- HTTP --------------------------------------------------------------------
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "MockEYWA/0.1"
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY the
+    # body waits for the client's delayed ACK (~40ms per request).
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.mock.verbose:
+            super().log_message(format, *args)
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        mock = self.server.mock
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self.reply(200, mock.stats())
+        elif path == "/.well-known/openid-configuration":
+            self.reply(200, mock.openid_configuration())
+        elif path == "/oauth/jwks" and mock.tokens.keys:
+            mock.count("/oauth/jwks")
+            self.reply(200, mock.tokens.jwks(),
+                       {"Cache-Control": "public, max-age=3600"})
+        else:
+            self.reply(404, {"error": "not_found"})
+
+    def do_POST(self):
+        mock = self.server.mock
+        path = urlparse(self.path).path
+        body = self.body()
+        mock.delay()
+        if path not in ("/oauth/token", "/graphql"):
+            self.reply(404, {"error": "not_found"})
+            return
+        if mock.fail():
+            mock.count("injected errors")
+            self.reply(503, {"errors": [{"message": "Injected failure"}]})
+            return
+        if path == "/oauth/token":
+            status, response = mock.token(parse_qs(body.decode()))
+            self.reply(status, response, {"Cache-Control": "no-store"})
+        else:
+            status, response = mock.graphql(body,
+                                            self.headers.get("Authorization"))
+            self.reply(status, response)
+
+
+class MockEywa:
+    """
+    In-memory EYWA stand-in. Use start()/stop() to run it in a
+    background thread, e.g. from a benchmark.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, latency=0.0, jitter=0.0,
+                 error_rate=0.0, require_auth=False, seed=None,
+                 verbose=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.require_auth = require_auth
+        self.verbose = verbose
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.store = Store()
+        self.counters = {}
+        self.counters_lock = threading.Lock()
+        self.executor = Executor(self.store, self.count)
+        self.persisted = {}
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.tokens = Tokens(self.url, hashlib.sha256(
+            str(seed).encode() if seed is not None else uuid.uuid4().bytes
+        ).digest())
+        self.thread = None
+
+    def delay(self):
+        with self.random_lock:
+            pause = self.latency + self.random.uniform(0, self.jitter)
+        if pause > 0:
+            time.sleep(pause)
+
+    def fail(self):
+        with self.random_lock:
+            return self.random.random() < self.error_rate
+
+    def count(self, name, amount=1):
+        with self.counters_lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def stats(self):
+        with self.counters_lock:
+            counters = dict(self.counters)
+        return {"requests": counters, "rows": self.store.counts()}
+
+    def openid_configuration(self):
+        configuration = {"issuer": self.url,
+                         "token_endpoint": f"{self.url}/oauth/token",
+                         "grant_types_supported": ["client_credentials"]}
+        if self.tokens.keys:
+            configuration["jwks_uri"] = f"{self.url}/oauth/jwks"
+            configuration["id_token_signing_alg_values_supported"] = ["RS256"]
+        return configuration
+
+    def token(self, form):
+        self.count("/oauth/token")
+        form = {key: values[0] for key, values in form.items()}
+        if form.get("grant_type") is None:
+            return 400, {"error": "invalid_request",
+                         "error_description": "Missing grant_type"}
+        if form["grant_type"] != "client_credentials":
+            return 400, {"error": "unsupported_grant_type",
+                         "error_description":
+                             f"Unsupported grant type {form['grant_type']}"}
+        client = CLIENTS.get(form.get("client_id"))
+        if client is None or not hmac.compare_digest(
+                client["secret"], form.get("client_secret", "")):
+            return 401, {"error": "invalid_client",
+                         "error_description": "Client authentication failed"}
+        scope = form.get("scope") or client["scope"]
+        return 200, {"access_token": self.tokens.issue(form["client_id"],
+                                                       scope),
+                     "type": "Bearer",
+                     "scope": scope,
+                     "expires_in": TOKEN_EXPIRY}
+
+    def graphql(self, body, authorization):
+        self.count("/graphql")
+        if self.require_auth:
+            token = (authorization or "").removeprefix("Bearer ").strip()
+            if not token or self.tokens.verify(token) is None:
+                return 401, {"errors": [{"message": "Unauthorized"}]}
+        try:
+            request = json.loads(body or b"{}")
+            query = self.persisted_query(request)
+            if query is None:
+                self.count("persisted misses")
+                return 200, {"data": None, "errors": [
+                    {"message": "PersistedQueryNotFound",
+                     "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}}]}
+            data = self.executor.execute(query, request.get("variables"))
+        except (GraphQLError, ValueError) as error:
+            self.count("graphql errors")
+            return 200, {"data": None, "errors": [{"message": str(error)}]}
+        return 200, {"data": data}
+
+    def persisted_query(self, request):
+        query = request.get("query") or ""
+        persisted = (request.get("extensions") or {}).get("persistedQuery")
+        if not persisted:
+            return query
+        digest = persisted.get("sha256Hash")
+        if query:
+            if hashlib.sha256(query.encode()).hexdigest() != digest:
+                raise GraphQLError("provided sha does not match query")
+            self.persisted[digest] = query
+            return query
+        query = self.persisted.get(digest)
+        if query is not None:
+            self.count("persisted hits")
+        return query
+
+    def seed_users(self, count):
+        self.store.sync("User", [{"euuid": str(uuid.UUID(int=index + 1)),
+                                  "name": f"user-{index + 1}",
+                                  "type": "PERSON",
+                                  "active": True,
+                                  "settings": None,
+                                  "avatar": None}
+                                 for index in range(count)])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to every POST request")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="random extra latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of POST requests answered with 503")
+    parser.add_argument("--require-auth", action="store_true",
+                        help="reject /graphql calls without a valid token")
+    parser.add_argument("--users", type=int, default=25,
+                        help="number of User rows to start with")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    options = parser.parse_args()
+
+    mock = MockEywa(options.host, options.port, options.latency,
+                    options.jitter, options.error_rate, options.require_auth,
+                    options.seed, options.verbose)
+    mock.seed_users(options.users)
+    print(f"🧪 Mock EYWA listening on {mock.url}")
+    try:
+        mock.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
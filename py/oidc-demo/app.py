@@ -1,27 +1,111 @@
-from flask import Flask, redirect, url_for, session, jsonify
+from flask import (Flask, Response, redirect, request, url_for, session,
+                   jsonify, stream_with_context)
 from authlib.integrations.flask_client import OAuth
+from requests.adapters import HTTPAdapter
 import requests
+import json
 import random
 import string
 import os
+import sys
+import time
+
+from session_store import MemoryStore, ServerSessionInterface, SqliteStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'client_credentials'))
+
+from jwt_verify import JwtError, Verifier  # noqa: E402
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
+# Session data (token set, id token claims) stays on the server, the
+# cookie only carries a random session id. SESSION_BACKEND=sqlite keeps
+# sessions across restarts and shares them between worker processes.
+if os.environ.get('SESSION_BACKEND') == 'sqlite':
+    session_db = os.environ.get('SESSION_DB', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'sessions.sqlite3'))
+    app.session_interface = ServerSessionInterface(SqliteStore(session_db))
+else:
+    app.session_interface = ServerSessionInterface(MemoryStore())
+
 # OAuth configuration
 oauth = OAuth(app)
 
 # OpenID Connect configuration
+EYWA_URL = 'http://localhost:8080'
+CLIENT_ID = 'GMTXXCLYXPIJHCLYHPVZDWWARYPMVLGIKFXKFAZNIGKLIDNJ'
+
 oidc = oauth.register(
     name='oidc',
-    client_id='GMTXXCLYXPIJHCLYHPVZDWWARYPMVLGIKFXKFAZNIGKLIDNJ',
+    client_id=CLIENT_ID,
     client_secret='-55tzQoNsHYcKqxPi9SCNvLDi9eYJgMl7n3vVAsy5uXhZrFx',
-    server_metadata_url='http://localhost:8080/.well-known/openid-configuration',
+    server_metadata_url=f'{EYWA_URL}/.well-known/openid-configuration',
     client_kwargs={
         'scope': 'openid profile email preferred_username permissions roles',
     }
 )
 
+# GraphQL API URL of the Resource Provider, used through one keep-alive
+# connection pool shared by all requests instead of a new connection
+# per page view.
+GRAPHQL_URL = f'{EYWA_URL}/graphql'
+GRAPHQL_TIMEOUT = 30
+POOL_SIZE = 20
+
+graphql_session = requests.Session()
+graphql_session.mount('http://', HTTPAdapter(pool_connections=1,
+                                             pool_maxsize=POOL_SIZE))
+graphql_session.mount('https://', HTTPAdapter(pool_connections=1,
+                                              pool_maxsize=POOL_SIZE))
+
+USER_FIELDS = ['euuid', 'name', 'type', 'active', 'settings', 'avatar']
+DEFAULT_FIELDS = 'euuid,name,type,active'
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code, text):
+        super().__init__(f'{status_code}: {text}')
+        self.status_code = status_code
+        self.text = text
+
+
+def fetch_users(access_token, fields, page_size, limit=None, offset=0):
+    """
+    One page of users ordered by euuid, skipping the first offset.
+    """
+    size = page_size if limit is None else min(page_size, limit)
+    # Without a total order, offset pages may overlap or leave gaps.
+    arguments = [f'_limit: {size}', '_order_by: {euuid: asc}']
+    if offset:
+        arguments.append(f'_offset: {offset}')
+    query = (f"{{ searchUser({', '.join(arguments)}) "
+             f"{{ {' '.join(fields)} }} }}")
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    try:
+        response = graphql_session.post(GRAPHQL_URL, json={'query': query},
+                                        headers=headers,
+                                        timeout=GRAPHQL_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        raise UpstreamError(502, str(e)) from e
+    if response.status_code != 200:
+        raise UpstreamError(response.status_code, response.text)
+    data = response.json()
+    if data.get('errors'):
+        raise UpstreamError(response.status_code, json.dumps(data['errors']))
+    return data['data']['searchUser'] or []
+
+
+# ID tokens are verified locally against the cached JWKS, and verified
+# claims are cached per token, so a profile view costs no round trip.
+id_tokens = Verifier(EYWA_URL, audience=CLIENT_ID)
+
 
 def generate_nonce(length=16):
     return ''.join(random.choices(
@@ -57,7 +141,22 @@ def auth():
     token = oidc.authorize_access_token()
     app.logger.debug(f'Received Token Set: {token}')
 
+    # The id token is verified once here and its claims kept in the
+    # session, so profile() does not parse it again on every view.
+    # A token that fails verification would fail again after another
+    # login, so the reason is reported instead of redirecting.
+    if 'id_token' not in token:
+        app.logger.warning('Token response carries no ID token')
+        return jsonify(error='No ID token in the token response'), 401
+    try:
+        claims = id_tokens.verify(token['id_token'], nonce=session.get('nonce'))
+    except JwtError as e:
+        app.logger.warning(f'ID token rejected: {e}')
+        return jsonify(error=f'ID token rejected: {e}'), 401
+
+    session.regenerate()
     session['user'] = token
+    session['claims'] = claims
     session['access_token'] = token.get('access_token')
     session['refresh_token'] = token.get('refresh_token')
 
@@ -74,7 +173,9 @@ def profile():
 
     app.logger.debug(f'Retrieved Nonce from Session: {nonce}')
 
-    user_info = oidc.parse_id_token(session['user'], nonce=nonce)
+    user_info = session.get('claims')
+    if user_info is None or user_info.get('exp', 0) <= time.time():
+        return redirect(url_for('login'))
     app.logger.debug(f'User Info: {user_info}')
     return f'<h1>User Profile</h1><pre>{user_info}</pre>'
 
@@ -82,50 +183,72 @@ def profile():
 # Route to interact with Resource Provider (RP) using GraphQL
 @app.route('/list-users')
 def list_users():
+    """
+    Users as a streamed JSON array, fetched from EYWA page by page.
+
+    Query parameters:
+        fields: comma separated, from USER_FIELDS (default DEFAULT_FIELDS;
+            settings and avatar only when asked for)
+        limit: most users to return (default all)
+        page_size: users per GraphQL request (default PAGE_SIZE)
+        offset: users to skip, e.g. the count a previous call returned
+    """
     # Check if the user is logged in and access token is available
     if 'access_token' not in session:
         return redirect(url_for('login'))
     access_token = session.get('access_token')
-    # GraphQL API URL of the Resource Provider
-    graphql_url = "http://localhost:8080/graphql"
-
-    # The GraphQL query to list users
-    query = """
-    {
-      searchUser {
-        euuid
-        name
-        settings
-        avatar
-      }
-    }
-    """
 
-    # Set up headers with the access token
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+    fields = request.args.get('fields', DEFAULT_FIELDS).split(',')
+    unknown = sorted(set(fields) - set(USER_FIELDS))
+    limit = request.args.get('limit', type=int)
+    page_size = request.args.get('page_size', PAGE_SIZE, type=int)
+    if unknown:
+        return jsonify(error=f"Unknown fields: {', '.join(unknown)}"), 400
+    if limit is not None and limit < 1:
+        return jsonify(error='limit must be at least 1'), 400
+    if page_size < 1 or page_size > MAX_PAGE_SIZE:
+        return jsonify(error=f'page_size must be 1..{MAX_PAGE_SIZE}'), 400
+    offset = request.args.get('offset', 0, type=int)
+    if offset < 0:
+        return jsonify(error='offset must not be negative'), 400
+
+    # The first page is fetched before responding, so a failure still
+    # gets a proper status code.
+    try:
+        page = fetch_users(access_token, fields, page_size, limit, offset)
+    except UpstreamError as e:
+        return (f"Failed to fetch users. Status code: {e.status_code}. "
+                f"Response: {e.text}", 502)
 
-    # Send the GraphQL request
-    response = requests.post(
-        graphql_url,
-        json={'query': query},
-        headers=headers)
+    def generate(page):
+        yield '['
+        sent = 0
+        while True:
+            for user in page:
+                yield (',' if sent else '') + json.dumps(user)
+                sent += 1
+            remaining = None if limit is None else limit - sent
+            if len(page) < page_size or remaining == 0:
+                break
+            try:
+                page = fetch_users(access_token, fields, page_size,
+                                   remaining, offset + sent)
+            except UpstreamError as e:
+                # Too late for an error status: leave the array open so
+                # the client cannot mistake a partial list for a whole.
+                app.logger.error(f'Users stream cut short: {e}')
+                return
+        yield ']'
 
-    # Check if the request was successful
-    if response.status_code == 200:
-        data = response.json()
-        return jsonify(data['data']['searchUser'])
-    else:
-        return f"Failed to fetch users. Status code: {response.status_code}. Response: {response.text}"
+    return Response(stream_with_context(generate(page)),
+                    mimetype='application/json')
 
 
 # Route to logout and clear session
 @app.route('/logout')
 def logout():
-    session.pop('user', None)
-    session.pop('nonce', None)
+    # Drops the whole server-side session, tokens included.
+    session.clear()
     return redirect(url_for('home'))
 
 
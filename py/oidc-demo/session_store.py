@@ -0,0 +1,172 @@
+"""
+Server-side Flask sessions
+
+Flask's default session is the whole session dict, signed, in a cookie,
+so the token set and id token travel with every request and are
+verified and decoded every time. Here the cookie only holds a random
+session id, and the data stays on the server in one of two stores:
+
+    MemoryStore   in-process LRU with a TTL, fastest, lost on restart
+    SqliteStore   SQLite file, survives restarts and is shared between
+                  worker processes
+
+    app.session_interface = ServerSessionInterface(MemoryStore())
+
+Sessions expire TTL seconds after they last changed.
+"""
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+TTL = 3600
+SIZE = 10000
+# Delete expired rows from SQLite at most this often (seconds).
+PURGE_INTERVAL = 60
+
+
+def new_id():
+    return secrets.token_urlsafe(32)
+
+
+class MemoryStore:
+    def __init__(self, size=SIZE, ttl=TTL, clock=time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, sid):
+        with self.lock:
+            entry = self.sessions.get(sid)
+            if entry is None:
+                return None
+            expires, data = entry
+            if self.clock() >= expires:
+                del self.sessions[sid]
+                return None
+            self.sessions.move_to_end(sid)
+            return dict(data)
+
+    def set(self, sid, data):
+        with self.lock:
+            self.sessions[sid] = (self.clock() + self.ttl, dict(data))
+            self.sessions.move_to_end(sid)
+            while len(self.sessions) > self.size:
+                self.sessions.popitem(last=False)
+
+    def delete(self, sid):
+        with self.lock:
+            self.sessions.pop(sid, None)
+
+
+class SqliteStore:
+    def __init__(self, path, ttl=TTL, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self.local = threading.local()
+        self.purged = 0
+        with self.connection() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS sessions (
+                              id TEXT PRIMARY KEY,
+                              data TEXT NOT NULL,
+                              expires REAL NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_expires "
+                       "ON sessions (expires)")
+
+    def connection(self):
+        """
+        One connection per thread, as the Flask dev server and most WSGI
+        servers handle requests on several threads.
+        """
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def get(self, sid):
+        row = self.connection().execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires > ?",
+            (sid, self.clock())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid, data):
+        now = self.clock()
+        with self.connection() as db:
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                       (sid, json.dumps(data), now + self.ttl))
+            if now - self.purged > PURGE_INTERVAL:
+                self.purged = now
+                db.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+
+    def delete(self, sid):
+        with self.connection() as db:
+            db.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, data=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(data, on_update)
+        self.sid = sid or new_id()
+        self.new = new
+        self.previous = None
+        self.modified = False
+
+    def regenerate(self):
+        """
+        Move the session to a fresh id, e.g. at login, so an id known
+        before (session fixation) does not carry over.
+        """
+        if self.previous is None and not self.new:
+            self.previous = self.sid
+        self.sid = new_id()
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSession(data, sid)
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.previous is not None:
+            self.store.delete(session.previous)
+            session.previous = None
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.modified:
+            self.store.set(session.sid, dict(session))
+        if session.modified or session.new:
+            response.set_cookie(name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,187 @@
+"""
+Local rating statistics for movies, actors and genres.
+
+`search_movies` and `search_actors` ask EYWA for `_count` and `_agg`
+of `movie_ratings` per movie, nested under every row. For analytics the
+ratings can instead be pulled once, as integer id columns from model.py,
+and grouped locally: per movie with `np.bincount` over movie ids, then
+per actor or genre by summing movie totals along the CSR relation.
+
+Thresholds use the `_where` operators of the GraphQL queries, so the
+defaults match what the examples ask the server for:
+
+    movie_stats(ratings, movies, {"good": ("_ge", 8), "bad": ("_le", 4)})
+
+    python aggregate.py [directory] [min ratings]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import dataset_cache
+import model
+import pagination
+
+
+OPERATORS = {
+    "_eq": np.equal,
+    "_neq": np.not_equal,
+    "_gt": np.greater,
+    "_ge": np.greater_equal,
+    "_lt": np.less,
+    "_le": np.less_equal,
+}
+
+MOVIE_THRESHOLDS = {"good": ("_ge", 8), "bad": ("_le", 4)}
+ACTOR_THRESHOLDS = {"good": ("_ge", 7), "bad": ("_le", 4)}
+
+MIN_RATINGS = 5
+TOP = 10
+
+
+class Stats:
+    """
+    Per group rating count, sum and threshold counts, indexed by id.
+    """
+    __slots__ = ("count", "total", "thresholds")
+
+    def __init__(self, count, total, thresholds):
+        self.count = count
+        self.total = total
+        self.thresholds = thresholds
+
+    def __len__(self):
+        return len(self.count)
+
+    def mean(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 0, self.total / self.count, np.nan)
+
+    def top(self, k=TOP, min_count=MIN_RATINGS):
+        """
+        Ids of the k groups with the highest average rating among those
+        with at least min_count ratings.
+        """
+        mean = np.where(self.count >= min_count, self.mean(), -np.inf)
+        k = min(k, int(np.count_nonzero(self.count >= min_count)))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64)
+        best = np.argpartition(-mean, k - 1)[:k]
+        return best[np.argsort(-mean[best], kind="stable")]
+
+    def row(self, id_):
+        """
+        Statistics of one group in the shape the GraphQL queries return.
+        """
+        count = int(self.count[id_])
+        return {"_count": {"all": count,
+                           **{name: int(counts[id_])
+                              for name, counts in self.thresholds.items()}},
+                "_agg": {"_avg": float(self.total[id_] / count)
+                         if count else None}}
+
+
+def movie_stats(ratings, size, thresholds=MOVIE_THRESHOLDS):
+    """
+    Group ratings by movie. size is the number of movie ids.
+    """
+    movies = ratings.movies
+    values = ratings.values
+    counts = {}
+    for name, (operator, value) in thresholds.items():
+        selected = OPERATORS[operator](values, value)
+        counts[name] = np.bincount(movies[selected], minlength=size)
+    return Stats(np.bincount(movies, minlength=size),
+                 np.bincount(movies, weights=values, minlength=size),
+                 counts)
+
+
+def relation_stats(per_movie, relation):
+    """
+    Roll per movie statistics up to the owners of a relation, e.g. all
+    ratings of movies an actor played in.
+    """
+    size = len(relation)
+    owners = np.repeat(np.arange(size, dtype=np.int32), relation.degrees())
+    targets = relation.targets
+
+    def roll_up(values):
+        return np.bincount(owners, weights=values[targets], minlength=size)
+
+    return Stats(roll_up(per_movie.count).astype(np.int64),
+                 roll_up(per_movie.total),
+                 {name: roll_up(counts).astype(np.int64)
+                  for name, counts in per_movie.thresholds.items()})
+
+
+def actor_stats(dataset, thresholds=ACTOR_THRESHOLDS):
+    per_movie = movie_stats(dataset.ratings, len(dataset.movie_ids),
+                            thresholds)
+    return relation_stats(per_movie, dataset.actor_movies)
+
+
+def genre_stats(dataset, thresholds=MOVIE_THRESHOLDS):
+    per_movie = movie_stats(dataset.ratings, len(dataset.movie_ids),
+                            thresholds)
+    return relation_stats(per_movie, dataset.genre_movies)
+
+
+async def fetch_ratings(dataset, page_size=5000):
+    """
+    Pull every UserRating from EYWA in pages and store them as columns
+    on dataset, interning euuids into its movie and user ids.
+    """
+    rows = pagination.search_rows("searchUserRating",
+                                  "value movie { euuid } user { euuid }",
+                                  page_size)
+    movies = []
+    users = []
+    values = []
+    async for row in rows:
+        movies.append(dataset.movie_ids.intern(row["movie"]["euuid"]))
+        users.append(dataset.user_ids.intern(row["user"]["euuid"]))
+        values.append(row["value"])
+    dataset.ratings = model.Ratings(movies, users, values)
+    return dataset.ratings
+
+
+def print_top(title, stats, entities, label, min_count=MIN_RATINGS):
+    print(f"\n{title}")
+    for id_ in stats.top(TOP, min_count).tolist():
+        entity = entities[id_] if id_ < len(entities) else None
+        row = stats.row(id_)
+        print(f"  {row['_agg']['_avg']:5.2f}  {row['_count']}  "
+              f"{getattr(entity, label, None)}")
+
+
+def report(dataset, min_count=MIN_RATINGS):
+    started = time.perf_counter()
+    movies = movie_stats(dataset.ratings, len(dataset.movie_ids))
+    actors = actor_stats(dataset)
+    genres = genre_stats(dataset)
+    elapsed = time.perf_counter() - started
+    print(f"Aggregated {len(dataset.ratings)} ratings for {len(movies)} "
+          f"movies, {len(actors)} actors and {len(genres)} genres "
+          f"in {elapsed * 1000:.1f} ms")
+    print_top("Top movies", movies, dataset.movies, "title", min_count)
+    print_top("Top actors", actors, dataset.actors, "name", min_count)
+    print_top("Genres", genres, dataset.genres, "name", 1)
+
+
+def main(directory=dataset_cache.DATASETS, min_count=MIN_RATINGS):
+    started = time.perf_counter()
+    dataset = model.MoviesDataset.load(directory, dataset_cache.load)
+    print(f"Loaded datasets in {time.perf_counter() - started:.2f}s")
+    if not len(dataset.ratings):
+        print(f"No user_ratings.json in {directory}")
+        return 1
+    report(dataset, min_count)
+    return 0
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else dataset_cache.DATASETS
+    min_count = int(sys.argv[2]) if len(sys.argv) > 2 else MIN_RATINGS
+    sys.exit(main(directory, min_count))
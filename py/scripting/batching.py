@@ -0,0 +1,275 @@
+"""
+Coalescing of concurrent GraphQL calls into one request.
+
+Calls made within a short window are collected and compatible ones are
+merged into a single aliased document: root fields of call i are
+aliased `b<i>_<field>` and its variables renamed `$b<i>_<name>`, so
+one round trip over the eywa pipe answers all of them. The merged
+response is split back into per-call responses for the awaiting
+coroutines, each with the errors whose path starts at one of its
+fields. If the merged request fails, its calls are retried one by
+one so each caller gets its own result or error.
+
+Identical read queries (same normalized text and variables) that are
+already waiting or in flight are sent once and share the response.
+
+Only queries are merged by default. Mutations keep their own request
+unless `merge_mutations` is set, since merging changes what fails
+together. Documents with fragments are always sent alone.
+
+    batcher = batching.install()   # wraps eywa.graphql
+    movies, actors = await asyncio.gather(search_movies(), search_actors())
+"""
+
+import asyncio
+import json
+
+import eywa
+from response_cache import normalize, tokens
+
+
+WINDOW = 0.005
+MAX_BATCH = 20
+
+
+class Unmergeable(Exception):
+    pass
+
+
+def split(query):
+    """
+    Return operation kind, variable definition tokens and root selection
+    tokens of a single operation document.
+    """
+    parts = tokens(query)
+    if any(token.startswith("...") or token == "fragment" for token in parts):
+        raise Unmergeable(query)
+    index = 0
+    kind = "query"
+    if parts and parts[0] in ("query", "mutation", "subscription"):
+        kind = parts[0]
+        index = 1
+        if index < len(parts) and parts[index] not in ("(", "{"):
+            index += 1
+    definitions = []
+    if index < len(parts) and parts[index] == "(":
+        end = parts.index(")", index)
+        definitions = parts[index + 1:end]
+        index = end + 1
+    if index >= len(parts) or parts[index] != "{" or parts[-1] != "}":
+        raise Unmergeable(query)
+    body = parts[index + 1:-1]
+    depth = 0
+    for token in body:
+        depth += {"{": 1, "}": -1}.get(token, 0)
+        if depth < 0:
+            raise Unmergeable(query)
+    return kind, definitions, body
+
+
+def rename(prefix, parts):
+    return [prefix + token if previous == "$" else token
+            for previous, token in zip([None] + parts, parts)]
+
+
+def alias_root_fields(prefix, body):
+    aliased = []
+    depth = parens = 0
+    for index, token in enumerate(body):
+        previous = body[index - 1] if index else None
+        following = body[index + 1] if index + 1 < len(body) else None
+        if token == "(":
+            parens += 1
+        elif token == ")":
+            parens -= 1
+        elif token == "{" and not parens:
+            depth += 1
+        elif token == "}" and not parens:
+            depth -= 1
+        elif (not depth and not parens and previous not in ("$", "@")
+              and (token[0].isalpha() or token[0] == "_")):
+            if following == ":":
+                token = prefix + token
+            elif previous != ":":
+                aliased.extend([prefix + token, ":"])
+        aliased.append(token)
+    return aliased
+
+
+def join(parts):
+    return " ".join(parts).replace("$ ", "$")
+
+
+def merge(calls):
+    """
+    Build one document and variables out of calls of the same kind.
+    """
+    definitions = []
+    selections = []
+    variables = {}
+    for index, call in enumerate(calls):
+        prefix = f"b{index}_"
+        definitions.extend(rename(prefix, call.definitions))
+        selections.extend(alias_root_fields(prefix,
+                                            rename(prefix, call.body)))
+        for name, value in (call.variables or {}).items():
+            variables[prefix + name] = value
+    header = calls[0].kind
+    if definitions:
+        header += f"({join(definitions)})"
+    return f"{header} {{ {join(selections)} }}", variables
+
+
+def unalias(key):
+    """
+    Call index and original name of an aliased root field.
+    """
+    index, _, name = key[1:].partition("_")
+    if not key.startswith("b") or not index.isdigit() or not name:
+        raise Unmergeable(key)
+    return int(index), name
+
+
+def unmerge(response, count):
+    """
+    Split a merged response into one response per call. Errors go to
+    the call whose aliased root field is first in their path; an error
+    that cannot be attributed raises Unmergeable, so the calls are sent
+    again one by one.
+    """
+    data = response.get("data", response) or {}
+    results = [{} for _ in range(count)]
+    errors = [[] for _ in range(count)]
+    for key, value in data.items():
+        index, name = unalias(key)
+        results[index][name] = value
+    for error in response.get("errors") or []:
+        path = error.get("path") if isinstance(error, dict) else None
+        if not path or not isinstance(path[0], str):
+            raise Unmergeable(error)
+        index, name = unalias(path[0])
+        if index >= count:
+            raise Unmergeable(error)
+        errors[index].append({**error, "path": [name] + list(path[1:])})
+    return [{"data": result, "errors": error} if error else {"data": result}
+            for result, error in zip(results, errors)]
+
+
+class Call:
+    __slots__ = ("key", "query", "variables", "kind", "definitions", "body",
+                 "future")
+
+    def __init__(self, key, query, variables, kind, definitions, body):
+        self.key = key
+        self.query = query
+        self.variables = variables
+        self.kind = kind
+        self.definitions = definitions
+        self.body = body
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class Batcher:
+    def __init__(self, graphql=None, window=WINDOW, max_batch=MAX_BATCH,
+                 merge_mutations=False):
+        self.send = graphql or eywa.graphql
+        self.window = window
+        self.max_batch = max_batch
+        self.merge_mutations = merge_mutations
+        self.pending = []
+        self.inflight = {}
+        self.timer = None
+        self.calls = 0
+        self.requests = 0
+        self.deduplicated = 0
+        self.fallbacks = 0
+
+    def counters(self):
+        return {"calls": self.calls,
+                "requests": self.requests,
+                "deduplicated": self.deduplicated,
+                "fallbacks": self.fallbacks}
+
+    async def graphql(self, query, variables=None):
+        self.calls += 1
+        try:
+            kind, definitions, body = split(query)
+        except Unmergeable:
+            kind = None
+        if kind is None or kind == "subscription" or (
+                kind == "mutation" and not self.merge_mutations):
+            self.requests += 1
+            return await self.send(query, variables)
+        key = None
+        if kind == "query":
+            key = (normalize(query), json.dumps(variables, sort_keys=True))
+            shared = self.inflight.get(key)
+            if shared is not None:
+                self.deduplicated += 1
+                return await asyncio.shield(shared)
+        call = Call(key, query, variables, kind, definitions, body)
+        if key is not None:
+            self.inflight[key] = call.future
+        self.pending.append(call)
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window,
+                                                               self.flush)
+        return await asyncio.shield(call.future)
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        calls, self.pending = self.pending, []
+        for kind in ("query", "mutation"):
+            group = [call for call in calls if call.kind == kind]
+            if group:
+                asyncio.ensure_future(self.dispatch(group))
+
+    async def dispatch(self, calls):
+        try:
+            if len(calls) == 1:
+                self.requests += 1
+                results = [await self.send(calls[0].query, calls[0].variables)]
+            else:
+                query, variables = merge(calls)
+                self.requests += 1
+                try:
+                    results = unmerge(await self.send(query, variables),
+                                      len(calls))
+                except Exception:
+                    self.fallbacks += 1
+                    results = await asyncio.gather(
+                        *(self.send(call.query, call.variables)
+                          for call in calls),
+                        return_exceptions=True)
+                    self.requests += len(calls)
+            for call, result in zip(calls, results):
+                if isinstance(result, BaseException):
+                    call.future.set_exception(result)
+                else:
+                    call.future.set_result(result)
+        except BaseException as error:
+            for call in calls:
+                if not call.future.done():
+                    call.future.set_exception(error)
+        finally:
+            for call in calls:
+                if call.key is not None:
+                    self.inflight.pop(call.key, None)
+
+
+def install(window=WINDOW, max_batch=MAX_BATCH, merge_mutations=False):
+    """
+    Route every eywa.graphql call in this process through a new batcher
+    and return it.
+    """
+    batcher = Batcher(eywa.graphql, window, max_batch, merge_mutations)
+    eywa.graphql = batcher.graphql
+    return batcher
+
+
+def uninstall(batcher):
+    eywa.graphql = batcher.send
@@ -0,0 +1,56 @@
+"""
+Compare parsing the movies datasets from JSON against loading them from
+the binary cache built by dataset_cache.py.
+
+    python bench_dataset_cache.py [repeats] [directory]
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+import dataset_cache
+
+
+def measure(load, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - started)
+    return min(timings), statistics.median(timings)
+
+
+def parse_json(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def main(repeats=10, directory=dataset_cache.DATASETS):
+    print(f"{'dataset':<28} {'json KB':>8} {'cache KB':>9} "
+          f"{'json ms':>8} {'cache ms':>9} {'speedup':>8}")
+    total_json = total_cache = 0
+    for path in dataset_cache.dataset_files(directory):
+        if not dataset_cache.is_fresh(path):
+            dataset_cache.build(path)
+        assert dataset_cache.load(path) == parse_json(path)
+        _, json_median = measure(lambda: parse_json(path), repeats)
+        _, cache_median = measure(lambda: dataset_cache.load(path), repeats)
+        total_json += json_median
+        total_cache += cache_median
+        name = os.path.basename(path)
+        print(f"{name:<28} "
+              f"{os.path.getsize(path) / 1024:>8.0f} "
+              f"{os.path.getsize(dataset_cache.cache_path(path)) / 1024:>9.0f} "
+              f"{json_median * 1000:>8.2f} {cache_median * 1000:>9.2f} "
+              f"{json_median / cache_median:>7.1f}x")
+    print(f"{'total':<28} {'':>8} {'':>9} {total_json * 1000:>8.2f} "
+          f"{total_cache * 1000:>9.2f} {total_json / total_cache:>7.1f}x")
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    directory = sys.argv[2] if len(sys.argv) > 2 else dataset_cache.DATASETS
+    main(repeats, directory)
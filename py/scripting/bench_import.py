@@ -0,0 +1,258 @@
+"""
+End-to-end benchmark of the movies import stages.
+
+Every stage (movies, actors, genres, users, both link files and ratings)
+is run against a GraphQL endpoint at several dataset scales and batch
+sizes. For each run the report records wall time, rows/s, requests,
+payload bytes, peak RSS and where client time went: JSON parsing of the
+dataset, request serialization and waiting on the server.
+
+Without --endpoint an in-process mock_eywa.py server is started, so the
+benchmark runs without a real EYWA. Datasets for each scale are made by
+generate.py and reused between runs.
+
+    python bench_import.py --scales 0.1,1 --batch-sizes 500,2000,all
+    python bench_import.py --output run2 --compare run1.json
+    python bench_import.py --endpoint https://eywa.example.com/graphql \\
+        --token $TOKEN --scales 1
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import sys
+import time
+
+import generate
+import movies
+import pool
+import registry
+import streaming
+from graphql_http import HttpGraphQL
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+# Stage name, mutation, mutation variable and dataset file.
+STAGES = [(stage, query, variable, name)
+          for stage, query, variable, name, _ in movies.STREAM_STAGES]
+STAGES.append(("ratings", movies.SYNC_RATINGS, "ratings", "user_ratings"))
+
+COLUMNS = ["scale", "batch_size", "stage", "rows", "seconds", "rows_per_s",
+           "requests", "request_bytes", "response_bytes", "parse_json_s",
+           "serialize_s", "request_s", "peak_rss_mb"]
+
+
+def reset_peak_rss():
+    # Linux resets VmHWM when "5" is written to clear_refs.
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+class TimedRows:
+    """
+    Iterates rows of a dataset file and sums up time spent parsing them.
+    """
+
+    def __init__(self, path):
+        self.rows = streaming.iter_json_array(path)
+        self.time = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self.rows)
+        finally:
+            self.time += time.perf_counter() - started
+
+
+def batches(rows, batch_size, max_bytes):
+    if batch_size == "all":
+        yield list(rows)
+        return
+    for batch, _ in streaming.iter_batches(rows, batch_size, max_bytes):
+        yield batch
+
+
+async def run_stage(client, directory, stage, query, variable, name,
+                    batch_size, max_bytes, concurrency, persisted=True):
+    rows = TimedRows(os.path.join(directory, f"{name}.json"))
+    if not persisted:
+        query = query.text
+
+    async def send(batch):
+        return await registry.execute(query, {variable: batch}, client)
+
+    client.reset()
+    reset_peak_rss()
+    started = time.perf_counter()
+    report = await pool.run_batches(stage, batches(rows, batch_size, max_bytes),
+                                    send, concurrency)
+    seconds = time.perf_counter() - started
+    counters = client.counters()
+    return {"stage": stage,
+            "rows": report.rows,
+            "seconds": round(seconds, 4),
+            "rows_per_s": round(report.rows / seconds, 1) if seconds else None,
+            "requests": counters["requests"],
+            "request_bytes": counters["request_bytes"],
+            "response_bytes": counters["response_bytes"],
+            "parse_json_s": round(rows.time, 4),
+            "serialize_s": round(counters["serialize_s"], 4),
+            "request_s": round(counters["request_s"], 4),
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def dataset_directory(options, scale):
+    if options.datasets:
+        return options.datasets
+    return generate.ensure(scale, options.seed)
+
+
+async def run(options, client):
+    results = []
+    for scale in options.scales:
+        directory = dataset_directory(options, scale)
+        for batch_size in options.batch_sizes:
+            for stage, query, variable, name in STAGES:
+                if options.stages and stage not in options.stages:
+                    continue
+                if not os.path.exists(os.path.join(directory, f"{name}.json")):
+                    print(f"Skipping {stage}, {name}.json not in {directory}")
+                    continue
+                result = await run_stage(client, directory, stage, query,
+                                         variable, name, batch_size,
+                                         options.max_bytes,
+                                         options.concurrency,
+                                         not options.full_text)
+                result.update(scale=scale, batch_size=batch_size)
+                results.append(result)
+    return results
+
+
+def write_report(results, options, endpoint):
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "endpoint": endpoint,
+              "python": platform.python_version(),
+              "concurrency": options.concurrency,
+              "persisted_queries": not options.full_text,
+              "results": results}
+    with open(f"{options.output}.json", "w") as file:
+        json.dump(report, file, indent=2)
+    with open(f"{options.output}.csv", "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({column: result.get(column) for column in COLUMNS})
+    print(f"\nWrote {options.output}.json and {options.output}.csv")
+
+
+def print_results(results, previous=None):
+    baseline = {}
+    for result in (previous or {}).get("results", []):
+        key = (result["scale"], str(result["batch_size"]), result["stage"])
+        baseline[key] = result
+    print(f"\n{'scale':>6} {'batch':>6} {'stage':<12} {'rows':>9} "
+          f"{'seconds':>8} {'rows/s':>9} {'req':>5} {'sent MB':>8} "
+          f"{'json s':>7} {'ser s':>6} {'wait s':>7} {'rss MB':>7}"
+          + (f" {'vs prev':>8}" if previous else ""))
+    for result in results:
+        line = (f"{result['scale']:>6} {str(result['batch_size']):>6} "
+                f"{result['stage']:<12} {result['rows']:>9} "
+                f"{result['seconds']:>8.2f} {result['rows_per_s'] or 0:>9.0f} "
+                f"{result['requests']:>5} "
+                f"{result['request_bytes'] / 2 ** 20:>8.2f} "
+                f"{result['parse_json_s']:>7.2f} {result['serialize_s']:>6.2f} "
+                f"{result['request_s']:>7.2f} "
+                f"{result['peak_rss_mb'] or 0:>7.0f}")
+        before = baseline.get((result["scale"], str(result["batch_size"]),
+                               result["stage"]))
+        if before and before.get("rows_per_s") and result["rows_per_s"]:
+            change = result["rows_per_s"] / before["rows_per_s"] - 1
+            line += f" {change:>+8.0%}"
+        print(line)
+
+
+def batch_size(value):
+    return value if value == "all" else int(value)
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--endpoint",
+                        help="GraphQL URL, defaults to an in-process mock")
+    parser.add_argument("--token", help="bearer token for --endpoint")
+    parser.add_argument("--datasets",
+                        help="use this dataset directory for every scale")
+    parser.add_argument("--scales", default="1",
+                        type=lambda value: [float(item)
+                                            for item in value.split(",")])
+    parser.add_argument("--batch-sizes", default="500,2000",
+                        type=lambda value: [batch_size(item)
+                                            for item in value.split(",")])
+    parser.add_argument("--max-bytes", type=int, default=8 * 2 ** 20,
+                        help="byte limit per batch, on top of batch size")
+    parser.add_argument("--stages", type=lambda value: value.split(","),
+                        help="comma separated stages, default all")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--full-text", action="store_true",
+                        help="send query text instead of persisted query ids")
+    parser.add_argument("--seed", type=int, default=generate.SEED)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="latency injected by the in-process mock")
+    parser.add_argument("--output", default="bench_import")
+    parser.add_argument("--compare", help="previous JSON report")
+    return parser.parse_args()
+
+
+def main():
+    options = parse_options()
+    mock = None
+    endpoint = options.endpoint
+    if endpoint is None:
+        from mock_eywa import MockEywa
+        mock = MockEywa(port=0, latency=options.latency, seed=options.seed)
+        mock.start()
+        endpoint = f"{mock.url}/graphql"
+        print(f"Started mock EYWA at {mock.url}")
+    client = HttpGraphQL(endpoint, options.token)
+    try:
+        results = asyncio.run(run(options, client))
+    finally:
+        if mock is not None:
+            mock.stop()
+    previous = None
+    if options.compare:
+        with open(options.compare) as file:
+            previous = json.load(file)
+    print_results(results, previous)
+    write_report(results, options, endpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measure memory held by the movies datasets loaded as plain JSON rows
+against the compact model from model.py.
+
+    python bench_model_memory.py [directory]
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import dataset_cache
+import model
+
+
+FILES = ["movies", "movie_actors", "movie_genres", "movie_users",
+         "movie_actors_mapping", "movie_genres_mapping"]
+# Loaded by both sides when present, as MoviesDataset.load does.
+RATINGS = "user_ratings"
+
+
+def files(directory):
+    present = os.path.exists(os.path.join(directory, f"{RATINGS}.json"))
+    return FILES + [RATINGS] if present else FILES
+
+
+def load_plain(directory):
+    return {name: dataset_cache.load(os.path.join(directory, f"{name}.json"))
+            for name in files(directory)}
+
+
+def measure(label, build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    data = build()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<16} {current / 2 ** 20:>10.1f} {peak / 2 ** 20:>10.1f} "
+          f"{elapsed:>9.2f}")
+    return data, current
+
+
+def main(directory=dataset_cache.DATASETS):
+    print(f"{'representation':<16} {'held MB':>10} {'peak MB':>10} "
+          f"{'load s':>9}")
+    plain, plain_bytes = measure("json rows", lambda: load_plain(directory))
+    del plain
+    dataset, compact_bytes = measure(
+        "compact model", lambda: model.MoviesDataset.load(directory))
+    print(f"\n{len(dataset.movies)} movies, {len(dataset.actors)} actors, "
+          f"{len(dataset.genres)} genres, {len(dataset.users)} users, "
+          f"{dataset.actor_movies.edges + dataset.genre_movies.edges} links, "
+          f"{len(dataset.ratings)} ratings")
+    print(f"compact model holds {compact_bytes / plain_bytes:.0%} "
+          f"of the memory of json rows")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,75 @@
+"""
+Time and memory of recommend.py per 100k ratings.
+
+Generates (or reuses) datasets at each scale, then measures building the
+rating matrix, the item neighbour lists and serving recommendations.
+Peak memory is traced in a separate single process run, since
+tracemalloc does not see pool workers.
+
+    python bench_recommend.py [scales] [workers]
+    python bench_recommend.py 1,2,5 4
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import dataset_cache
+import generate
+import model
+import recommend
+
+
+USERS = 1000
+
+
+def build(dataset, workers):
+    started = time.perf_counter()
+    matrix = recommend.RatingMatrix(dataset.ratings, len(dataset.user_ids),
+                                    len(dataset.movie_ids))
+    built = time.perf_counter()
+    neighbours = recommend.item_neighbours(matrix, workers=workers)
+    done = time.perf_counter()
+    return recommend.Recommender(matrix, *neighbours), built - started, \
+        done - built
+
+
+def peak_memory(dataset):
+    tracemalloc.start()
+    build(dataset, 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(scales=(1,), workers=None):
+    workers = workers or os.cpu_count() or 1
+    print(f"{'scale':>6} {'ratings':>9} {'matrix s':>9} {'similar s':>10} "
+          f"{'rec ms':>7} {'peak MB':>8} {'s/100k':>7} {'MB/100k':>8}")
+    for scale in scales:
+        directory = generate.ensure(scale)
+        dataset = model.MoviesDataset.load(directory, dataset_cache.load)
+        ratings = len(dataset.ratings)
+        recommender, matrix_time, similarity_time = build(dataset, workers)
+        users = np.flatnonzero(recommender.matrix.user_movies.degrees())
+        users = users[:USERS]
+        started = time.perf_counter()
+        for user in users.tolist():
+            recommender.recommend(user)
+        serve = (time.perf_counter() - started) / max(len(users), 1)
+        peak = peak_memory(dataset) / 2 ** 20
+        per = 100_000 / ratings
+        print(f"{scale:>6} {ratings:>9} {matrix_time:>9.2f} "
+              f"{similarity_time:>10.2f} {serve * 1000:>7.2f} {peak:>8.1f} "
+              f"{(matrix_time + similarity_time) * per:>7.2f} "
+              f"{peak * per:>8.1f}")
+
+
+if __name__ == "__main__":
+    scales = ([float(scale) for scale in sys.argv[1].split(",")]
+              if len(sys.argv) > 1 else [1])
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    main(scales, workers)
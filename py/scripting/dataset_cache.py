@@ -0,0 +1,122 @@
+"""
+Binary cache for the movies datasets.
+
+Every JSON file can be compiled into a marshal file under `.cache/`
+next to it. Repeated strings such as euuids are interned first, so the
+cache stores each of them once. The cache header holds the size and
+modification time of the source file, and `load` only uses a cache that
+matches its source, falling back to parsing JSON otherwise.
+
+    python dataset_cache.py build [directory]
+    python dataset_cache.py clean [directory]
+"""
+
+import glob
+import json
+import marshal
+import os
+import struct
+import sys
+
+
+DATASETS = "../../datasets/movies"
+CACHE_DIR = ".cache"
+FORMAT = 1
+HEADER = struct.Struct("<I")
+
+
+def cache_path(path):
+    directory, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(directory, CACHE_DIR, f"{stem}.marshal")
+
+
+def source_key(path):
+    stat = os.stat(path)
+    return (FORMAT, tuple(sys.version_info[:2]), stat.st_size,
+            stat.st_mtime_ns)
+
+
+def intern_strings(value, strings):
+    if isinstance(value, str):
+        return strings.setdefault(value, value)
+    if isinstance(value, list):
+        return [intern_strings(item, strings) for item in value]
+    if isinstance(value, dict):
+        return {strings.setdefault(key, key): intern_strings(item, strings)
+                for key, item in value.items()}
+    return value
+
+
+def build(path):
+    key = source_key(path)
+    with open(path, encoding="utf-8") as file:
+        data = intern_strings(json.load(file), {})
+    target = cache_path(path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = f"{target}.partial"
+    header = marshal.dumps(key)
+    with open(partial, "wb") as file:
+        file.write(HEADER.pack(len(header)))
+        file.write(header)
+        file.write(marshal.dumps(data))
+    os.replace(partial, target)
+    return target
+
+
+def read_key(file):
+    size, = HEADER.unpack(file.read(HEADER.size))
+    return marshal.loads(file.read(size))
+
+
+def is_fresh(path):
+    try:
+        with open(cache_path(path), "rb") as file:
+            return read_key(file) == source_key(path)
+    except (OSError, EOFError, ValueError, TypeError, struct.error):
+        return False
+
+
+def load(path):
+    """
+    Load a JSON dataset, from its cache when the cache is fresh.
+    """
+    try:
+        with open(cache_path(path), "rb") as file:
+            if read_key(file) == source_key(path):
+                return marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError, struct.error):
+        pass
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def dataset_files(directory=DATASETS):
+    return sorted(glob.glob(os.path.join(directory, "*.json")))
+
+
+def build_all(directory=DATASETS):
+    for path in dataset_files(directory):
+        target = build(path)
+        print(f"{path} -> {target} "
+              f"({os.path.getsize(path) / 1024:.0f} KB -> "
+              f"{os.path.getsize(target) / 1024:.0f} KB)")
+
+
+def clean(directory=DATASETS):
+    for path in dataset_files(directory):
+        target = cache_path(path)
+        if os.path.exists(target):
+            os.remove(target)
+            print(f"Removed {target}")
+
+
+if __name__ == "__main__":
+    action = sys.argv[1] if len(sys.argv) > 1 else "build"
+    directory = sys.argv[2] if len(sys.argv) > 2 else DATASETS
+    if action == "build":
+        build_all(directory)
+    elif action == "clean":
+        clean(directory)
+    else:
+        print("Unknown command!")
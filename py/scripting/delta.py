@@ -0,0 +1,150 @@
+"""
+Delta sync for the movies datasets.
+
+A content fingerprint of every row is stored per stage and euuid after
+a successful import. The next import compares rows against it and only
+sends rows that were inserted or modified, and reports euuids that
+disappeared from the dataset.
+
+Relation lists such as the `movies` of a mapping row are compared as
+sets, and the related euuids are kept as well so the links added and
+removed per actor or genre can be reported.
+"""
+
+import hashlib
+import json
+import sqlite3
+
+
+def relation_key(item):
+    if isinstance(item, dict) and "euuid" in item:
+        return item["euuid"]
+    return json.dumps(item, sort_keys=True)
+
+
+def canonical(row):
+    normalized = {}
+    for key, value in row.items():
+        if isinstance(value, list):
+            value = sorted(value, key=relation_key)
+        normalized[key] = value
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+def fingerprint(row):
+    digest = hashlib.blake2b(canonical(row).encode("utf-8"), digest_size=16)
+    return digest.hexdigest()
+
+
+def links(row):
+    return sorted(relation_key(item)
+                  for value in row.values() if isinstance(value, list)
+                  for item in value)
+
+
+class Delta:
+    def __init__(self, stage):
+        self.stage = stage
+        self.changed = []
+        self.inserted = 0
+        self.modified = 0
+        self.unchanged = 0
+        self.removed = []
+        self.added_links = 0
+        self.removed_links = 0
+        self.fingerprints = {}
+
+    def summary(self):
+        line = (f"[{self.stage}] {self.inserted} inserted, {self.modified} "
+                f"modified, {self.unchanged} unchanged, {len(self.removed)} "
+                f"removed")
+        if self.added_links or self.removed_links:
+            line += (f", {self.added_links} links added, "
+                     f"{self.removed_links} links removed")
+        print(line)
+        return line
+
+
+def diff(stage, previous, rows):
+    """
+    Compare rows against fingerprints from the previous import.
+    `previous` maps euuid to a (fingerprint, links) pair, as returned
+    by DeltaState.previous.
+    """
+    delta = Delta(stage)
+    for row in rows:
+        euuid = row["euuid"]
+        current = fingerprint(row)
+        related = links(row)
+        delta.fingerprints[euuid] = (current, related)
+        before = previous.get(euuid)
+        if before is None:
+            delta.inserted += 1
+            delta.added_links += len(related)
+            delta.changed.append(row)
+        elif before[0] != current:
+            delta.modified += 1
+            old, new = set(before[1]), set(related)
+            delta.added_links += len(new - old)
+            delta.removed_links += len(old - new)
+            delta.changed.append(row)
+        else:
+            delta.unchanged += 1
+    for euuid, (_, related) in previous.items():
+        if euuid not in delta.fingerprints:
+            delta.removed.append(euuid)
+            delta.removed_links += len(related)
+    return delta
+
+
+class DeltaState:
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, isolation_level=None)
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                stage TEXT NOT NULL,
+                euuid TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                links TEXT NOT NULL,
+                PRIMARY KEY (stage, euuid)
+            )""")
+        return self.connection
+
+    def previous(self, stage):
+        rows = self.connect().execute(
+            "SELECT euuid, hash, links FROM fingerprints WHERE stage = ?",
+            (stage,))
+        return {euuid: (hash_, json.loads(related))
+                for euuid, hash_, related in rows}
+
+    def save(self, stage, fingerprints):
+        connection = self.connect()
+        connection.execute("BEGIN")
+        try:
+            connection.execute("DELETE FROM fingerprints WHERE stage = ?",
+                               (stage,))
+            connection.executemany(
+                "INSERT INTO fingerprints VALUES (?, ?, ?, ?)",
+                ((stage, euuid, hash_, json.dumps(related))
+                 for euuid, (hash_, related) in fingerprints.items()))
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def reset(self, stage=None):
+        if stage is None:
+            self.connect().execute("DELETE FROM fingerprints")
+        else:
+            self.connect().execute("DELETE FROM fingerprints WHERE stage = ?",
+                                   (stage,))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
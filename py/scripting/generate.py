@@ -0,0 +1,329 @@
+"""
+Synthetic movies datasets at any scale.
+
+Writes the same files as datasets/movies, plus user_ratings, sized by a
+scale factor relative to the shipped datasets (5000 movies, 2000 actors,
+10000 users). Output is deterministic for a given seed and scale.
+
+Rows are written to disk as they are generated. Euuids are derived from
+the seed and row index instead of being remembered, so memory stays
+small even at 1000x; only genre membership is kept, as int arrays.
+
+Fan-out is skewed like real catalogues: the number of movies per actor
+and ratings per user follow a log-normal distribution, and movies are
+picked with a power law so a few popular titles collect most links.
+Records reported for mapping files are links, not rows.
+
+    python generate.py [scale] [seed] [directory]
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from array import array
+
+
+DIRECTORY = "../../datasets/generated"
+SEED = 42
+
+MOVIES = 5000
+ACTORS = 2000
+USERS = 10000
+
+MOVIES_PER_ACTOR = 12
+RATINGS_PER_USER = 10
+GENRES_PER_MOVIE = (1, 3)
+# Movie index is n * u ** POPULARITY for uniform u, so low indices are
+# picked far more often than high ones.
+POPULARITY = 2.5
+
+VARIANT = "89ab"
+
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Sci-Fi", "Romance",
+          "Thriller", "Documentary", "Animation", "Fantasy", "Mystery",
+          "Adventure"]
+
+ADJECTIVES = ["Profound", "Synergistic", "Down-sized", "Object-based",
+              "Robust", "Seamless", "Proactive", "Distributed", "Visionary",
+              "Adaptive", "Balanced", "Cross-platform", "Ergonomic",
+              "Focused", "Horizontal", "Innovative", "Reactive", "Silent",
+              "Total", "Universal"]
+QUALIFIERS = ["real-time", "stable", "transitional", "24hour", "dynamic",
+              "global", "heuristic", "modular", "neutral", "optimal",
+              "radical", "static", "tertiary", "uniform", "zero-defect"]
+NOUNS = ["protocol", "standardization", "monitoring", "hierarchy",
+         "paradigm", "framework", "algorithm", "interface", "matrix",
+         "project", "alliance", "archive", "capacity", "firmware",
+         "horizon", "initiative", "journey", "migration", "network",
+         "workforce"]
+FIRST_NAMES = ["Sandra", "Tammie", "Joseph", "Kayla", "Miguel", "Phillip",
+               "Victoria", "Christopher", "Anna", "David", "Elena", "Frank",
+               "Grace", "Henry", "Irene", "Jack", "Laura", "Marco", "Nina",
+               "Oscar", "Paula", "Quinn", "Rosa", "Samuel", "Tara"]
+LAST_NAMES = ["Brown", "Peck", "Gill", "Morgan", "Harris", "Mcclure",
+              "Mccullough", "Burke", "Novak", "Horvat", "Smith", "Garcia",
+              "Kowalski", "Silva", "Jensen", "Rossi", "Dubois", "Ivanov",
+              "Tanaka", "Okafor"]
+COUNTRIES = ["Mauritius", "Iceland", "Sudan", "Kiribati", "Saudi Arabia",
+             "Ethiopia", "Mauritania", "Croatia", "Brazil", "Canada",
+             "Japan", "Kenya", "Norway", "Peru", "Portugal", "Vietnam"]
+REVIEWS = ["Loved it", "Not for me", "A masterpiece", "Too long",
+           "Great cast", "Weak plot", "Would watch again", "Average",
+           "Stunning visuals", "Forgettable", ""]
+
+
+def scaled(count, scale):
+    return max(1, int(round(count * scale)))
+
+
+def euuids(seed, kind):
+    """
+    Return a function mapping row index to a stable, random looking
+    version 4 euuid. Much cheaper than building uuid.UUID objects.
+    """
+    base = hashlib.blake2b(f"eywa-examples:{seed}:{kind}".encode(),
+                           digest_size=16)
+
+    def euuid(index):
+        digest = base.copy()
+        digest.update(str(index).encode())
+        x = digest.hexdigest()
+        return (f"{x[:8]}-{x[8:12]}-4{x[13:16]}-"
+                f"{VARIANT[int(x[16], 16) & 3]}{x[17:20]}-{x[20:]}")
+    return euuid
+
+
+def rng(seed, kind):
+    return random.Random(f"{seed}:{kind}")
+
+
+def fan_out(random_, mean, limit):
+    # Log-normal with the given mean and a long tail.
+    sigma = 0.8
+    count = random_.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+    return max(1, min(limit, int(round(count))))
+
+
+def popular(random_, count):
+    return int(count * random_.random() ** POPULARITY)
+
+
+class ArrayWriter:
+    """
+    Writes a JSON array to a file one row at a time. Rows go to
+    `<path>.partial`, which replaces path only once the array is
+    complete, so an interrupted run never leaves a truncated file that
+    ensure() would take for a finished one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.partial = f"{path}.partial"
+        self.file = None
+        self.rows = 0
+
+    def __enter__(self):
+        self.file = open(self.partial, "w", encoding="utf-8")
+        self.file.write("[")
+        return self
+
+    def separator(self):
+        if self.rows:
+            self.file.write(",\n ")
+        self.rows += 1
+
+    def write(self, row):
+        self.separator()
+        self.file.write(json.dumps(row, separators=(",", ":")))
+
+    def __exit__(self, error_type, *_):
+        if error_type is not None:
+            self.file.close()
+            os.remove(self.partial)
+            return
+        self.file.write("]\n")
+        self.file.close()
+        os.replace(self.partial, self.path)
+
+
+def generate_movies(path, count, seed):
+    random_ = rng(seed, "movies")
+    movie = euuids(seed, "movies")
+    with ArrayWriter(path) as writer:
+        for index in range(count):
+            writer.write({
+                "euuid": movie(index),
+                "title": f"{random_.choice(ADJECTIVES)} "
+                         f"{random_.choice(QUALIFIERS)} "
+                         f"{random_.choice(NOUNS)}",
+                "release_year": random_.randint(1950, 2024)})
+    return writer.rows
+
+
+def person_name(random_):
+    return f"{random_.choice(FIRST_NAMES)} {random_.choice(LAST_NAMES)}"
+
+
+def generate_actors(path, count, seed):
+    random_ = rng(seed, "actors")
+    actor = euuids(seed, "actors")
+    with ArrayWriter(path) as writer:
+        for index in range(count):
+            writer.write({
+                "euuid": actor(index),
+                "name": person_name(random_),
+                "birth_year": random_.randint(1930, 2005),
+                "nationality": random_.choice(COUNTRIES)})
+    return writer.rows
+
+
+def generate_genres(path, seed):
+    genre = euuids(seed, "genres")
+    with ArrayWriter(path) as writer:
+        for index, name in enumerate(GENRES):
+            writer.write({"euuid": genre(index), "name": name})
+    return writer.rows
+
+
+def generate_users(path, count, seed):
+    random_ = rng(seed, "users")
+    user = euuids(seed, "users")
+    with ArrayWriter(path) as writer:
+        for index in range(count):
+            joined = (f"{random_.randint(2000, 2024)}-"
+                      f"{random_.randint(1, 12):02d}-"
+                      f"{random_.randint(1, 28):02d}T00:00:00Z")
+            writer.write({
+                "euuid": user(index),
+                "name": person_name(random_),
+                "join_date": joined,
+                "country": random_.choice(COUNTRIES)})
+    return writer.rows
+
+
+def generate_actor_links(path, actors, movies, seed):
+    random_ = rng(seed, "actor links")
+    actor = euuids(seed, "actors")
+    movie = euuids(seed, "movies")
+    links = 0
+    with ArrayWriter(path) as writer:
+        for index in range(actors):
+            count = fan_out(random_, MOVIES_PER_ACTOR, movies)
+            picked = {popular(random_, movies) for _ in range(count)}
+            links += len(picked)
+            writer.write({"euuid": actor(index),
+                          "movies": [{"euuid": movie(target)}
+                                     for target in sorted(picked)]})
+    return links
+
+
+def generate_genre_links(path, movies, seed):
+    random_ = rng(seed, "genre links")
+    genre = euuids(seed, "genres")
+    movie = euuids(seed, "movies")
+    members = [array("i") for _ in GENRES]
+    for index in range(movies):
+        for target in random_.sample(range(len(GENRES)),
+                                     random_.randint(*GENRES_PER_MOVIE)):
+            members[target].append(index)
+    links = 0
+    # Genre rows hold a large share of all movies, so their movie lists
+    # are written item by item as well.
+    with ArrayWriter(path) as writer:
+        for index, indexes in enumerate(members):
+            writer.separator()
+            writer.file.write(f'{{"euuid":"{genre(index)}","movies":[')
+            for position, target in enumerate(indexes):
+                if position:
+                    writer.file.write(",")
+                writer.file.write(f'{{"euuid":"{movie(target)}"}}')
+            writer.file.write("]}")
+            links += len(indexes)
+    return links
+
+
+def generate_ratings(path, users, movies, seed):
+    random_ = rng(seed, "ratings")
+    rating = euuids(seed, "ratings")
+    user = euuids(seed, "users")
+    movie = euuids(seed, "movies")
+    count = 0
+    with ArrayWriter(path) as writer:
+        for index in range(users):
+            reviewer = {"euuid": user(index)}
+            ratings = fan_out(random_, RATINGS_PER_USER, movies)
+            for target in {popular(random_, movies) for _ in range(ratings)}:
+                # Every movie has its own typical rating between 3 and 9.
+                typical = 3 + (target * 2654435761 % 601) / 100
+                value = min(10, max(1, round(random_.gauss(typical, 1.5))))
+                writer.write({
+                    "euuid": rating(count),
+                    "value": value,
+                    "review": random_.choice(REVIEWS),
+                    "movie": {"euuid": movie(target)},
+                    "user": reviewer})
+                count += 1
+    return count
+
+
+def generate(scale=1, seed=SEED, directory=DIRECTORY):
+    os.makedirs(directory, exist_ok=True)
+    movies = scaled(MOVIES, scale)
+    actors = scaled(ACTORS, scale)
+    users = scaled(USERS, scale)
+
+    def path(name):
+        return os.path.join(directory, f"{name}.json")
+
+    steps = [
+        ("movies", lambda: generate_movies(path("movies"), movies, seed)),
+        ("movie_actors",
+         lambda: generate_actors(path("movie_actors"), actors, seed)),
+        ("movie_genres", lambda: generate_genres(path("movie_genres"), seed)),
+        ("movie_users",
+         lambda: generate_users(path("movie_users"), users, seed)),
+        ("movie_actors_mapping",
+         lambda: generate_actor_links(path("movie_actors_mapping"),
+                                      actors, movies, seed)),
+        ("movie_genres_mapping",
+         lambda: generate_genre_links(path("movie_genres_mapping"),
+                                      movies, seed)),
+        ("user_ratings",
+         lambda: generate_ratings(path("user_ratings"), users, movies, seed)),
+    ]
+    print(f"Generating {scale}x movies datasets with seed {seed} "
+          f"into {directory}")
+    print(f"  {'file':<22} {'records':>12} {'size':>12} {'time':>8}")
+    for name, step in steps:
+        started = time.perf_counter()
+        records = step()
+        print(f"  {name:<22} {records:>12} "
+              f"{os.path.getsize(path(name)) / 2 ** 20:>9.1f} MB "
+              f"{time.perf_counter() - started:>7.1f}s")
+
+
+def ensure(scale=1, seed=SEED, directory=DIRECTORY):
+    """
+    Return the directory holding datasets for scale and seed under
+    directory, generating them first if any file is missing.
+    """
+    # 1 and 1.0 name the same datasets.
+    target = os.path.join(directory,
+                          f"x{format(float(scale), 'g')}-seed{seed}")
+    names = ("movies", "movie_actors", "movie_genres", "movie_users",
+             "movie_actors_mapping", "movie_genres_mapping", "user_ratings")
+    if not all(os.path.exists(os.path.join(target, f"{name}.json"))
+               for name in names):
+        generate(scale, seed, target)
+    return target
+
+
+if __name__ == "__main__":
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else SEED
+    directory = sys.argv[3] if len(sys.argv) > 3 else DIRECTORY
+    generate(scale, seed, directory)
@@ -0,0 +1,152 @@
+"""
+Local index of the actor <-> movie <-> genre graph.
+
+The mapping files describe a bipartite graph that the scripts otherwise
+only ship to EYWA. `Graph` keeps both directions of each relation as CSR
+int arrays from model.py, so lookups are array slices and multi-hop
+queries expand whole frontiers at once with `Relation.rows` and a
+visited mask instead of walking dicts of lists.
+
+All methods take and return integer ids from the dataset interners;
+`actor_id`/`movie_id` and the entity lists of `dataset` map between ids
+and euuids or rows.
+
+    python graph.py [directory]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import dataset_cache
+import model
+
+
+class Graph:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        movies = len(dataset.movie_ids)
+        self.actor_movies = dataset.actor_movies
+        self.movie_actors = dataset.actor_movies.transpose(movies)
+        self.genre_movies = dataset.genre_movies
+        self.movie_genres = dataset.genre_movies.transpose(movies)
+
+    @classmethod
+    def load(cls, directory=dataset_cache.DATASETS):
+        return cls(model.MoviesDataset.load(directory, dataset_cache.load))
+
+    def actor_id(self, euuid):
+        return self.dataset.actor_ids.get(euuid)
+
+    def movie_id(self, euuid):
+        return self.dataset.movie_ids.get(euuid)
+
+    def movies_by_actor(self, actor):
+        return self.actor_movies.row(actor)
+
+    def actors_by_movie(self, movie):
+        return self.movie_actors.row(movie)
+
+    def movies_by_genre(self, genre):
+        return self.genre_movies.row(genre)
+
+    def genres_by_movie(self, movie):
+        return self.movie_genres.row(movie)
+
+    def actors_by_genre(self, genre):
+        """
+        Actors with at least one movie in genre, and how many.
+        """
+        actors = self.movie_actors.rows(self.genre_movies.row(genre))
+        return np.unique(actors, return_counts=True)
+
+    def co_actors(self, actor):
+        """
+        Actors sharing a movie with actor and the number of shared
+        movies, most shared first.
+        """
+        actors = self.movie_actors.rows(self.actor_movies.row(actor))
+        actors, shared = np.unique(actors[actors != actor],
+                                   return_counts=True)
+        order = np.argsort(-shared, kind="stable")
+        return actors[order], shared[order]
+
+    def neighbourhood(self, actor, hops=2):
+        """
+        Actors within the given number of co-actor hops of actor, as
+        (actors, distances) sorted by distance.
+        """
+        distance = np.full(len(self.actor_movies), -1, dtype=np.int32)
+        seen_movies = np.zeros(len(self.movie_actors), dtype=bool)
+        distance[actor] = 0
+        frontier = np.array([actor], dtype=np.int64)
+        for hop in range(1, hops + 1):
+            movies = np.unique(self.actor_movies.rows(frontier))
+            movies = movies[~seen_movies[movies]]
+            seen_movies[movies] = True
+            actors = np.unique(self.movie_actors.rows(movies))
+            frontier = actors[distance[actors] < 0]
+            if not len(frontier):
+                break
+            distance[frontier] = hop
+        actors = np.flatnonzero(distance >= 0)
+        order = np.argsort(distance[actors], kind="stable")
+        return actors[order], distance[actors[order]]
+
+    def related_movies(self, movie, hops=1):
+        """
+        Movies reachable from movie through shared actors within hops,
+        excluding movie itself.
+        """
+        seen = np.zeros(len(self.movie_actors), dtype=bool)
+        seen[movie] = True
+        frontier = np.array([movie], dtype=np.int64)
+        for _ in range(hops):
+            actors = np.unique(self.movie_actors.rows(frontier))
+            movies = np.unique(self.actor_movies.rows(actors))
+            frontier = movies[~seen[movies]]
+            seen[frontier] = True
+        seen[movie] = False
+        return np.flatnonzero(seen)
+
+
+def timed(label, function, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<28} {best * 1e6:>9.0f} us")
+    return result
+
+
+def main(directory=dataset_cache.DATASETS):
+    started = time.perf_counter()
+    graph = Graph.load(directory)
+    print(f"Indexed {graph.actor_movies.edges} actor links and "
+          f"{graph.genre_movies.edges} genre links in "
+          f"{time.perf_counter() - started:.2f}s")
+    dataset = graph.dataset
+    actor = int(np.argmax(graph.actor_movies.degrees()))
+    movie = int(graph.movies_by_actor(actor)[0])
+    print(f"\nActor {dataset.actors[actor].name}, movie "
+          f"{dataset.movies[movie].title}")
+    movies = timed("movies by actor", graph.movies_by_actor, actor)
+    actors = timed("actors by movie", graph.actors_by_movie, movie)
+    co_actors, shared = timed("co-actors", graph.co_actors, actor)
+    genre_actors, _ = timed("actors by genre", graph.actors_by_genre, 0)
+    related = timed("related movies, 1 hop", graph.related_movies, movie)
+    for hops in (1, 2, 3):
+        near, _ = timed(f"{hops}-hop neighbourhood",
+                        graph.neighbourhood, actor, hops)
+        print(f"    {len(near)} actors")
+    print(f"\n{len(movies)} movies, {len(actors)} actors in the first one, "
+          f"{len(co_actors)} co-actors, {len(genre_actors)} actors in "
+          f"{dataset.genres[0].name}, {len(related)} related movies")
+    for co_actor, count in zip(co_actors[:5].tolist(), shared[:5].tolist()):
+        print(f"  {count} shared movies with {dataset.actors[co_actor].name}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -5,21 +5,21 @@ import numpy as np
 import sys
 import pprint
 
+import pagination
 
-async def search_users():
-    return await eywa.graphql("""{
-    searchUser (_limit:2000) {
-      euuid
-      name
-      type
-    }
-    }""")
+
+def search_users(page_size=pagination.PAGE_SIZE):
+    return pagination.search_rows("searchUser", "euuid name type", page_size)
 
 
 async def main():
     eywa.open_pipe()
-    users = await search_users()
-    print("Users\n" + str(users))
+    print("Users")
+    count = 0
+    async for user in search_users():
+        print(user)
+        count += 1
+    print(f"{count} users")
     eywa.exit()
 
 
@@ -0,0 +1,105 @@
+"""
+GraphQL over plain HTTP with the same call shape as `eywa.graphql`.
+
+Scripts talk to EYWA through the pipe opened by `eywa.open_pipe()`.
+Benchmarks need to point them at any endpoint instead, e.g. the local
+mock_eywa.py, and to see where time goes. `HttpGraphQL.graphql` can be
+swapped in for `eywa.graphql` and keeps counters of requests, payload
+bytes and time spent serializing, waiting and parsing.
+
+`persisted` sends a persisted query: only the SHA-256 hash of a known
+document, with the full text sent once if the server asks for it.
+"""
+
+import asyncio
+import json
+import time
+import urllib.error
+import urllib.request
+
+
+class GraphQLError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors[0].get("message") if errors else "Unknown")
+        self.errors = errors
+
+
+class HttpGraphQL:
+    def __init__(self, url, token=None, timeout=60):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.serialize_time = 0.0
+        self.request_time = 0.0
+        self.parse_time = 0.0
+        self.persisted_misses = 0
+
+    def counters(self):
+        return {"requests": self.requests,
+                "request_bytes": self.request_bytes,
+                "response_bytes": self.response_bytes,
+                "serialize_s": self.serialize_time,
+                "request_s": self.request_time,
+                "parse_s": self.parse_time,
+                "persisted_misses": self.persisted_misses}
+
+    def post(self, body):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url, data=body, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as error:
+            return error.read()
+
+    async def send(self, payload):
+        started = time.perf_counter()
+        body = json.dumps(payload).encode()
+        serialized = time.perf_counter()
+        raw = await asyncio.to_thread(self.post, body)
+        received = time.perf_counter()
+        response = json.loads(raw)
+        self.parse_time += time.perf_counter() - received
+        self.request_time += received - serialized
+        self.serialize_time += serialized - started
+        self.requests += 1
+        self.request_bytes += len(body)
+        self.response_bytes += len(raw)
+        return response
+
+    async def graphql(self, query, variables=None):
+        response = await self.send({"query": query, "variables": variables})
+        if response.get("errors"):
+            raise GraphQLError(response["errors"])
+        return response
+
+    async def persisted(self, query_hash, query, variables=None):
+        extensions = {"persistedQuery": {"version": 1,
+                                         "sha256Hash": query_hash}}
+        response = await self.send({"variables": variables,
+                                    "extensions": extensions})
+        if is_persisted_miss(response.get("errors")):
+            self.persisted_misses += 1
+            response = await self.send({"query": query,
+                                        "variables": variables,
+                                        "extensions": extensions})
+        if response.get("errors"):
+            raise GraphQLError(response["errors"])
+        return response
+
+
+def is_persisted_miss(errors):
+    for error in errors or ():
+        code = (error.get("extensions") or {}).get("code")
+        if (code == "PERSISTED_QUERY_NOT_FOUND"
+                or error.get("message") == "PersistedQueryNotFound"):
+            return True
+    return False
@@ -0,0 +1,68 @@
+"""
+Checkpoint journal for resumable imports.
+
+Every batch EYWA acknowledged is recorded in a small SQLite file, keyed
+by stage and a content hash of the batch. A rerun after a failure skips
+batches found in the journal and only sends what is missing.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def batch_hash(batch):
+    encoded = json.dumps(batch, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, isolation_level=None)
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS batches (
+                stage TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                acknowledged REAL NOT NULL,
+                PRIMARY KEY (stage, hash)
+            )""")
+        return self.connection
+
+    def done(self, stage, batch):
+        row = self.connect().execute(
+            "SELECT 1 FROM batches WHERE stage = ? AND hash = ?",
+            (stage, batch_hash(batch))).fetchone()
+        return row is not None
+
+    def record(self, stage, batch):
+        if isinstance(batch, dict):
+            rows = sum(len(value) for value in batch.values()
+                       if isinstance(value, list))
+        else:
+            rows = len(batch)
+        self.connect().execute(
+            "INSERT OR REPLACE INTO batches VALUES (?, ?, ?, ?)",
+            (stage, batch_hash(batch), rows, time.time()))
+
+    def stages(self):
+        return dict(self.connect().execute(
+            "SELECT stage, SUM(rows) FROM batches GROUP BY stage"))
+
+    def reset(self, stage=None):
+        if stage is None:
+            self.connect().execute("DELETE FROM batches")
+        else:
+            self.connect().execute("DELETE FROM batches WHERE stage = ?",
+                                   (stage,))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,270 @@
+"""
+Compact in-memory model of the movies datasets.
+
+Euuids are interned into dense integer ids per entity type, entities are
+kept in `__slots__` classes indexed by those ids, and actor -> movie and
+genre -> movie relations are stored as CSR int arrays instead of lists
+of `{"euuid": ...}` dicts. User ratings, when present, are kept as
+parallel columns of movie id, user id and value. Rows are converted back
+to the GraphQL input shape only when they are about to be sent.
+"""
+
+import os
+from array import array
+
+import numpy as np
+
+import dataset_cache
+import streaming
+
+
+class Interner:
+    __slots__ = ("ids", "values")
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def intern(self, value):
+        id_ = self.ids.get(value)
+        if id_ is None:
+            id_ = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return id_
+
+    def get(self, value):
+        return self.ids.get(value)
+
+    def lookup(self, id_):
+        return self.values[id_]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class Entity:
+    __slots__ = ("id",)
+    FIELDS = ()
+
+    def __init__(self, id_, *values):
+        self.id = id_
+        for field, value in zip(self.FIELDS, values):
+            setattr(self, field, value)
+
+    @classmethod
+    def from_row(cls, id_, row):
+        return cls(id_, *(row.get(field) for field in cls.FIELDS))
+
+    def to_input(self, euuids):
+        data = {"euuid": euuids.lookup(self.id)}
+        for field in self.FIELDS:
+            data[field] = getattr(self, field)
+        return data
+
+
+class Movie(Entity):
+    FIELDS = ("title", "release_year")
+    __slots__ = FIELDS
+
+
+class Actor(Entity):
+    FIELDS = ("name", "birth_year", "nationality")
+    __slots__ = FIELDS
+
+
+class Genre(Entity):
+    FIELDS = ("name",)
+    __slots__ = FIELDS
+
+
+class User(Entity):
+    FIELDS = ("name", "join_date", "country")
+    __slots__ = FIELDS
+
+
+class Relation:
+    """
+    Compressed sparse rows: targets of owner `i` are
+    `targets[indptr[i]:indptr[i + 1]]`.
+    """
+    __slots__ = ("indptr", "targets")
+
+    def __init__(self, indptr, targets):
+        self.indptr = indptr
+        self.targets = targets
+
+    @classmethod
+    def from_edges(cls, owners, targets, size):
+        owners = np.asarray(owners, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        order = np.argsort(owners, kind="stable")
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(owners, minlength=size), out=indptr[1:])
+        return cls(indptr, targets[order])
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def edges(self):
+        return len(self.targets)
+
+    def row(self, owner):
+        if owner >= len(self):
+            return self.targets[:0]
+        return self.targets[self.indptr[owner]:self.indptr[owner + 1]]
+
+    def positions(self, owners):
+        """
+        Indexes into targets of all given owners' rows, concatenated.
+        """
+        owners = np.asarray(owners, dtype=np.int64)
+        starts = self.indptr[owners]
+        lengths = self.indptr[owners + 1] - starts
+        ends = np.cumsum(lengths)
+        offsets = np.repeat(starts - ends + lengths, lengths)
+        return offsets + np.arange(ends[-1] if len(ends) else 0)
+
+    def rows(self, owners):
+        """
+        Targets of all given owners concatenated, without a Python loop.
+        """
+        return self.targets[self.positions(owners)]
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def transpose(self, size):
+        owners = np.repeat(np.arange(len(self), dtype=np.int32),
+                           self.degrees())
+        return Relation.from_edges(self.targets, owners, size)
+
+    def to_input(self, owner_ids, target_ids, field="movies"):
+        for owner in range(len(self)):
+            row = self.row(owner)
+            if len(row):
+                yield {"euuid": owner_ids.lookup(owner),
+                       field: [{"euuid": target_ids.lookup(target)}
+                               for target in row.tolist()]}
+
+
+def read_relation(rows, owner_ids, target_ids, field="movies"):
+    owners = array("i")
+    targets = array("i")
+    for row in rows:
+        owner = owner_ids.intern(row["euuid"])
+        for item in row.get(field) or ():
+            owners.append(owner)
+            targets.append(target_ids.intern(item["euuid"]))
+    return owners, targets
+
+
+class Ratings:
+    """
+    User ratings as columns: rating `i` is `values[i]` given by user
+    `users[i]` to movie `movies[i]`.
+    """
+    __slots__ = ("movies", "users", "values")
+
+    def __init__(self, movies, users, values):
+        self.movies = np.asarray(movies, dtype=np.int32)
+        self.users = np.asarray(users, dtype=np.int32)
+        self.values = np.asarray(values, dtype=np.float32)
+
+    @classmethod
+    def from_rows(cls, rows, movie_ids, user_ids):
+        movies = array("i")
+        users = array("i")
+        values = array("f")
+        for row in rows:
+            movies.append(movie_ids.intern(row["movie"]["euuid"]))
+            users.append(user_ids.intern(row["user"]["euuid"]))
+            values.append(row["value"])
+        return cls(movies, users, values)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class MoviesDataset:
+    def __init__(self):
+        self.movie_ids = Interner()
+        self.actor_ids = Interner()
+        self.genre_ids = Interner()
+        self.user_ids = Interner()
+        self.movies = []
+        self.actors = []
+        self.genres = []
+        self.users = []
+        self.actor_movies = Relation.from_edges([], [], 0)
+        self.genre_movies = Relation.from_edges([], [], 0)
+        self.ratings = Ratings([], [], [])
+
+    @staticmethod
+    def read_entities(rows, ids, entities, cls):
+        for row in rows:
+            id_ = ids.intern(row["euuid"])
+            entity = cls.from_row(id_, row)
+            if id_ < len(entities):
+                entities[id_] = entity
+            else:
+                entities.extend([None] * (id_ - len(entities)))
+                entities.append(entity)
+
+    @classmethod
+    def load(cls, directory=dataset_cache.DATASETS,
+             rows=streaming.iter_json_array):
+        """
+        Build the model from dataset files. `rows` reads a file into an
+        iterable of rows; the default streams it so the parsed JSON is
+        never held as a whole.
+        """
+        dataset = cls()
+
+        def path(name):
+            return os.path.join(directory, f"{name}.json")
+
+        cls.read_entities(rows(path("movies")), dataset.movie_ids,
+                          dataset.movies, Movie)
+        cls.read_entities(rows(path("movie_actors")), dataset.actor_ids,
+                          dataset.actors, Actor)
+        cls.read_entities(rows(path("movie_genres")), dataset.genre_ids,
+                          dataset.genres, Genre)
+        cls.read_entities(rows(path("movie_users")), dataset.user_ids,
+                          dataset.users, User)
+        owners, targets = read_relation(rows(path("movie_actors_mapping")),
+                                        dataset.actor_ids, dataset.movie_ids)
+        dataset.actor_movies = Relation.from_edges(
+            owners, targets, len(dataset.actor_ids))
+        owners, targets = read_relation(rows(path("movie_genres_mapping")),
+                                        dataset.genre_ids, dataset.movie_ids)
+        dataset.genre_movies = Relation.from_edges(
+            owners, targets, len(dataset.genre_ids))
+        if os.path.exists(path("user_ratings")):
+            dataset.ratings = Ratings.from_rows(rows(path("user_ratings")),
+                                                dataset.movie_ids,
+                                                dataset.user_ids)
+        return dataset
+
+    @staticmethod
+    def entities_input(entities, ids):
+        return (entity.to_input(ids) for entity in entities
+                if entity is not None)
+
+    def movies_input(self):
+        return self.entities_input(self.movies, self.movie_ids)
+
+    def actors_input(self):
+        return self.entities_input(self.actors, self.actor_ids)
+
+    def genres_input(self):
+        return self.entities_input(self.genres, self.genre_ids)
+
+    def users_input(self):
+        return self.entities_input(self.users, self.user_ids)
+
+    def actor_links_input(self):
+        return self.actor_movies.to_input(self.actor_ids, self.movie_ids)
+
+    def genre_links_input(self):
+        return self.genre_movies.to_input(self.genre_ids, self.movie_ids)
@@ -1,202 +1,289 @@
 import eywa
 import asyncio
 import json
-import numpy as np
 import sys
 import pprint
 
-
-async def search_users():
-    return await eywa.graphql("""{
-    searchUser (_limit:2000) {
-      euuid
-      name
-      type
-    }
-    }""")
+import aggregate
+import batching
+import dataset_cache
+import delta
+import journal
+import model
+import pagination
+import pool
+import registry
+import response_cache
+import scheduler
+import streaming
+import validate
+
+
+def search_users(page_size=pagination.PAGE_SIZE):
+    return pagination.search_rows("searchUser", "euuid name type", page_size)
+
+
+async def export_users(path, page_size=pagination.PAGE_SIZE):
+    """
+    Write all users to path as JSON lines, one page in memory at a time.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as file:
+        async for user in search_users(page_size):
+            file.write(json.dumps(user) + "\n")
+            count += 1
+    return count
 
 
 # async def insert_movies():
 
 
+queries = registry.queries
+
+
 async def delete_movies_dataset():
-    return await eywa.graphql("""
-    mutation {
-        deleteDataset(euuid:"6b48570e-e629-45f7-b118-b27239690a05")
-    }
-    """)
+    return await registry.execute(queries["delete_dataset"])
 
 
 async def deploy_movies_dataset():
     dataset = None
     with open("../../datasets/Movies_Example_0_2.json") as file:
         dataset = file.read()
-    return await eywa.graphql("""
-    mutation ($dataset: Transit) {
-        importDataset(dataset:$dataset) {
-            euuid
-            name
-            deployed
-        }
-    }
-    """, {"dataset": dataset})
+    return await registry.execute(queries["deploy_dataset"],
+                                  {"dataset": dataset})
 
 
-def load_dataset(name):
-    with open(f"../../datasets/movies/{name}.json") as file:
-        return json.load(file)
+DATASETS = "../../datasets/movies"
 
+SYNC_MOVIES = queries["sync_movies"]
+SYNC_ACTORS = queries["sync_actors"]
+SYNC_GENRES = queries["sync_genres"]
+SYNC_USERS = queries["sync_users"]
+LINK_MOVIES = queries["link_movies"]
 
-async def import_movies():
-    return await eywa.graphql("""
-    mutation($movies:[MovieInput]) {
-        syncMovieList(data:$movies) {
-            euuid
-            title
-        }
-    }
-    """,
-                              {"movies": load_dataset("movies")})
 
+def dataset_path(name):
+    return f"{DATASETS}/{name}.json"
 
-async def import_actors():
-    return await eywa.graphql("""
-    mutation($actors:[MovieActorInput]) {
-        syncMovieActorList(data:$actors) {
-            euuid
-        }
-    }
-    """,
-                              {"actors": load_dataset("movie_actors")})
 
+def load_dataset(name):
+    return dataset_cache.load(dataset_path(name))
 
-async def import_genres():
-    return await eywa.graphql("""
-    mutation($genres:[MovieGenreInput]) {
-        syncMovieGenreList(data:$genres) {
-            euuid
-        }
-    }
-    """,
-                              {"genres": load_dataset("movie_genres")})
 
+# Acknowledged batches of an unfinished import. Cleared once an import
+# completes or the dataset is deleted.
+checkpoints = journal.Journal(f"{DATASETS}/.import_journal.sqlite")
 
-async def import_users():
-    return await eywa.graphql("""
-    mutation($users:[MovieUserInput]) {
-        syncMovieUserList(data:$users) {
-            euuid
-        }
-    }
-    """,
-                              {"users": load_dataset("movie_users")})
+# Row fingerprints from the last successful import, used by delta imports.
+# Cleared when the dataset is deleted.
+fingerprints = delta.DeltaState(f"{DATASETS}/.import_state.sqlite")
 
 
-async def link_movies():
-    return await eywa.graphql("""
-    mutation($genres:[MovieGenreInput] $actors:[MovieActorInput]) {
-        syncMovieGenreList(data:$genres) {
-            euuid
-        }
-        syncMovieActorList(data:$actors) {
-            euuid
-        }
-    }
-    """,
-                              {"genres": load_dataset("movie_genres_mapping"),
-                               "actors": load_dataset("movie_actors_mapping")})
-
-
-async def import_rating_part(part):
-    print(f'Importing {len(part)} user ratings!')
-    result = await eywa.graphql("""
-    mutation($ratings:[UserRatingInput]) {
-        syncUserRatingList(data:$ratings) {
-            euuid
-        }
-    }
-    """, {"ratings": part.tolist()})
-    print('Import finished')
+async def sync_once(stage, query, variables):
+    if checkpoints.done(stage, variables):
+        print(f"[{stage}] already imported, skipping")
+        return None
+    result = await registry.execute(query, variables)
+    checkpoints.record(stage, variables)
     return result
 
 
-async def import_ratings():
-    all_ratings = load_dataset("user_ratings")
-    partitioned = np.array_split(all_ratings, 6)
-    tasks = [import_rating_part(part) for part in partitioned]
-    results = await asyncio.gather(*tasks)
-    return True
+async def import_movies():
+    return await sync_once("movies", SYNC_MOVIES,
+                           {"movies": load_dataset("movies")})
 
 
-async def import_data():
-    await import_movies()
-    print('Imported Movies')
-    await import_actors()
-    print('Imported Actors')
-    await import_genres()
-    print('Imported Genres')
-    await import_users()
-    print('Imported Movie users')
-    await link_movies()
-    print('Linked movies to actors and genres')
-    await import_ratings()
-    print('Imported User ratings')
+async def import_actors():
+    return await sync_once("actors", SYNC_ACTORS,
+                           {"actors": load_dataset("movie_actors")})
 
 
-async def search_movies():
-    return await eywa.graphql("""
-    {
-      searchMovie(_limit: 10) {
-        title
-        _count {
-          all: movie_ratings
-          good: movie_ratings(_where: {value: {_ge: 8}})
-          bad: movie_ratings(_where: {value: {_le: 4}})
-        }
-        _agg {
-          movie_ratings {
-            _avg {
-              value
-            }
-          }
-        }
-        movie_ratings {
-          value
-          review
-        }
-        actors (_limit:10) {
-          name
-          birth_year
-        }
-      }
-    }
-    """)
+async def import_genres():
+    return await sync_once("genres", SYNC_GENRES,
+                           {"genres": load_dataset("movie_genres")})
 
 
-async def search_actors():
-    return await eywa.graphql("""
-   {
-      searchMovieActor(_limit: 10) {
-        name
-        birth_year
-        movies(_limit: 5) {
-          title
-          _agg {
-            movie_ratings {
-              _avg {
-                value
-              }
-            }
-          }
-          _count {
-            all_reviews: movie_ratings
-            good_reviews: movie_ratings(_where: {value: {_ge: 7}})
-            bad_reviews: movie_ratings(_where: {value: {_le: 4}})
-          }
-        }
-      }
-    }
-    """)
+async def import_users():
+    return await sync_once("users", SYNC_USERS,
+                           {"users": load_dataset("movie_users")})
+
+
+async def link_movies():
+    return await sync_once("links", LINK_MOVIES,
+                           {"genres": load_dataset("movie_genres_mapping"),
+                            "actors": load_dataset("movie_actors_mapping")})
+
+
+# Stage name, mutation, mutation variable, dataset file and required stages.
+# Mappings go through the same sync mutations as the entities they link.
+STREAM_STAGES = [
+    ("movies", SYNC_MOVIES, "movies", "movies", ()),
+    ("actors", SYNC_ACTORS, "actors", "movie_actors", ()),
+    ("genres", SYNC_GENRES, "genres", "movie_genres", ()),
+    ("users", SYNC_USERS, "users", "movie_users", ()),
+    ("genre links", SYNC_GENRES, "genres", "movie_genres_mapping",
+     ("movies", "genres")),
+    ("actor links", SYNC_ACTORS, "actors", "movie_actors_mapping",
+     ("movies", "actors")),
+]
+
+
+async def stream_import_data(max_rows=streaming.MAX_ROWS,
+                             max_bytes=streaming.MAX_BYTES,
+                             concurrency=scheduler.CONCURRENCY):
+    validate.check(DATASETS, load=streaming.iter_json_array)
+
+    def stream(stage, query, variable, name):
+        async def run():
+            rows = streaming.iter_json_array(dataset_path(name))
+            return await streaming.stream_sync(
+                stage, query, variable, rows, max_rows, max_bytes,
+                checkpoints)
+        return run
+
+    stages = [scheduler.Stage(stage, stream(stage, query, variable, name),
+                              requires)
+              for stage, query, variable, name, requires in STREAM_STAGES]
+    reports = await scheduler.run_stages(stages, concurrency)
+    checkpoints.reset()
+    snapshot_fingerprints()
+    return reports
+
+
+DELETE_MUTATIONS = {
+    "movies": "deleteMovie",
+    "actors": "deleteMovieActor",
+    "genres": "deleteMovieGenre",
+    "users": "deleteMovieUser",
+}
+
+
+def snapshot_fingerprints():
+    for stage, _, _, name, _ in STREAM_STAGES:
+        rows = streaming.iter_json_array(dataset_path(name))
+        fingerprints.save(stage, delta.diff(stage, {}, rows).fingerprints)
+
+
+async def delete_rows(mutation, euuids, size=100):
+    for chunk in pool.chunked(euuids, size):
+        fields = "\n".join(f'd{index}: {mutation}(euuid: "{euuid}")'
+                           for index, euuid in enumerate(chunk))
+        await eywa.graphql(f"mutation {{\n{fields}\n}}")
+
+
+async def delta_import_data(deletes=False,
+                            concurrency=scheduler.CONCURRENCY):
+    """
+    Send only rows that changed since the last successful import. Rows
+    removed from a mapping file have their links cleared, rows removed
+    from an entity file are deleted when `deletes` is set.
+    """
+    validate.check(DATASETS, load=streaming.iter_json_array)
+
+    def sync(stage, query, variable, name):
+        async def run():
+            previous = fingerprints.previous(stage)
+            rows = streaming.iter_json_array(dataset_path(name))
+            changes = delta.diff(stage, previous, rows)
+            changes.summary()
+            if changes.changed:
+                await streaming.stream_sync(stage, query, variable,
+                                            changes.changed)
+            kept = changes.fingerprints
+            if changes.removed and name.endswith("_mapping"):
+                cleared = [{"euuid": euuid, "movies": []}
+                           for euuid in changes.removed]
+                await streaming.stream_sync(stage, query, variable, cleared)
+            elif changes.removed and deletes:
+                await delete_rows(DELETE_MUTATIONS[stage], changes.removed)
+            elif changes.removed:
+                kept = {**kept, **{euuid: previous[euuid]
+                                   for euuid in changes.removed}}
+            fingerprints.save(stage, kept)
+            return changes
+        return run
+
+    stages = [scheduler.Stage(stage, sync(stage, query, variable, name),
+                              requires)
+              for stage, query, variable, name, requires in STREAM_STAGES]
+    changes = await scheduler.run_stages(stages, concurrency)
+    print("\nDelta import summary")
+    for stage_changes in changes.values():
+        stage_changes.summary()
+    return changes
+
+
+SYNC_RATINGS = queries["sync_ratings"]
+
+
+async def import_ratings(batch_size=pool.BATCH_SIZE,
+                         concurrency=pool.CONCURRENCY):
+    async def send(batch):
+        return await registry.execute(SYNC_RATINGS, {"ratings": batch})
+
+    ratings = load_dataset("user_ratings")
+    return await pool.run_batches("ratings", pool.chunked(ratings, batch_size),
+                                  send, concurrency, journal=checkpoints)
+
+
+# Stage name, import function and required stages.
+IMPORT_STAGES = [
+    ("movies", import_movies, ()),
+    ("actors", import_actors, ()),
+    ("genres", import_genres, ()),
+    ("users", import_users, ()),
+    ("links", link_movies, ("movies", "actors", "genres")),
+    ("ratings", import_ratings, ("movies", "users")),
+]
+
+
+async def import_data(concurrency=scheduler.CONCURRENCY):
+    validate.check(DATASETS)
+    stages = [scheduler.Stage(name, run, requires)
+              for name, run, requires in IMPORT_STAGES]
+    results = await scheduler.run_stages(stages, concurrency)
+    checkpoints.reset()
+    snapshot_fingerprints()
+    return results
+
+
+async def search_movies(limit=10):
+    return await registry.execute(queries["search_movies"], {"limit": limit})
+
+
+async def search_actors(limit=10):
+    return await registry.execute(queries["search_actors"], {"limit": limit})
+
+
+async def dashboard(rounds=5, interval=1.0):
+    """
+    Refresh movie and actor summaries like a dashboard would. Both
+    queries go out together as one batched request, and repeats are
+    served from the response cache until a mutation touches them.
+    """
+    batcher = batching.install()
+    cache = response_cache.install()
+    try:
+        for _ in range(rounds):
+            movies, actors = await asyncio.gather(search_movies(),
+                                                  search_actors())
+            print(f"{len(movies['data']['searchMovie'])} movies, "
+                  f"{len(actors['data']['searchMovieActor'])} actors, "
+                  f"cache {cache.counters()}, batching {batcher.counters()}")
+            await asyncio.sleep(interval)
+    finally:
+        response_cache.uninstall(cache)
+        batching.uninstall(batcher)
+
+
+async def rating_stats():
+    """
+    Pull all ratings once and compute movie, actor and genre statistics
+    locally instead of nested `_count`/`_agg` queries.
+    """
+    dataset = model.MoviesDataset.load(DATASETS, dataset_cache.load)
+    await aggregate.fetch_ratings(dataset)
+    aggregate.report(dataset)
 
 
 async def bad_query():
@@ -212,17 +299,45 @@ async def main():
     action = sys.argv[1:][0]
     if action == "delete":
         await delete_movies_dataset()
+        checkpoints.reset()
+        fingerprints.reset()
         print("Movies dataset deleted!")
     elif action == "deploy":
         await deploy_movies_dataset()
         print("Movies dataset deployed!")
     elif action == "import":
-        await import_data()
+        limits = [int(arg) for arg in sys.argv[2:3]]
+        await import_data(*limits)
+        print("Imported Movies data")
+    elif action == "import_stream":
+        limits = [int(arg) for arg in sys.argv[2:5]]
+        await stream_import_data(*limits)
+        print("Imported Movies data")
+    elif action == "import_delta":
+        await delta_import_data(deletes="deletes" in sys.argv[2:])
         print("Imported Movies data")
+    elif action == "validate":
+        validate.main(DATASETS)
+    elif action == "journal":
+        for stage, rows in checkpoints.stages().items():
+            print(f"{stage}: {rows} rows acknowledged")
+    elif action == "reset_journal":
+        checkpoints.reset()
+        print("Import journal cleared")
+    elif action == "export_users":
+        path = sys.argv[2] if len(sys.argv) > 2 else "users.jsonl"
+        page_size = [int(arg) for arg in sys.argv[3:4]]
+        count = await export_users(path, *page_size)
+        print(f"Exported {count} users to {path}")
     elif action == "show_movies":
         print(pprint.pprint(await search_movies()))
     elif action == "show_actors":
         print(pprint.pprint(await search_actors()))
+    elif action == "dashboard":
+        rounds = [int(arg) for arg in sys.argv[2:3]]
+        await dashboard(*rounds)
+    elif action == "rating_stats":
+        await rating_stats()
     elif action == "error":
         print(await bad_query())
     else:
@@ -230,4 +345,5 @@ async def main():
     eywa.exit()
 
 
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
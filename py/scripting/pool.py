@@ -0,0 +1,109 @@
+"""
+Bounded worker pool for sending batches to EYWA.
+
+A fixed number of workers pull batches from a shared iterator, so no
+more than `concurrency` requests are in flight. A failed batch is
+retried on its own with exponential backoff, without touching batches
+that already went through.
+"""
+
+import asyncio
+import random
+import time
+
+
+BATCH_SIZE = 2000
+CONCURRENCY = 4
+RETRIES = 4
+BACKOFF = 0.5
+
+
+def chunked(rows, size=BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+class BatchFailed(Exception):
+    def __init__(self, stage, failures):
+        super().__init__(f"{len(failures)} {stage} batches failed, "
+                         f"first error: {failures[0][1]}")
+        self.stage = stage
+        self.failures = failures
+
+
+class PoolReport:
+    def __init__(self, stage):
+        self.stage = stage
+        self.rows = 0
+        self.batches = 0
+        self.retries = 0
+        self.skipped = 0
+        self.failures = []
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def summary(self):
+        elapsed = self.elapsed
+        if elapsed is None:
+            elapsed = time.perf_counter() - self.started
+        rate = self.rows / elapsed if elapsed else float("inf")
+        line = (f"[{self.stage}] {self.rows} rows in {self.batches} batches, "
+                f"{elapsed:.2f} s ({rate:.0f} rows/s), "
+                f"{self.retries} retries, {len(self.failures)} failed batches, "
+                f"{self.skipped} batches already in journal")
+        print(line)
+        return line
+
+
+async def send_with_retry(send, batch, report, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            return await send(batch)
+        except Exception as error:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            delay += random.uniform(0, delay / 2)
+            report.retries += 1
+            print(f"[{report.stage}] batch of {len(batch)} rows failed "
+                  f"({error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def run_batches(stage, batches, send, concurrency=CONCURRENCY,
+                      retries=RETRIES, backoff=BACKOFF, journal=None):
+    """
+    Send every batch with `send(batch)` using at most `concurrency`
+    workers. Raises BatchFailed listing batches that still failed after
+    all retries, once every other batch has been sent.
+
+    With a journal, batches it already holds are skipped and every
+    acknowledged batch is recorded.
+    """
+    report = PoolReport(stage)
+    batches = enumerate(batches)
+
+    async def worker():
+        for index, batch in batches:
+            if journal is not None and journal.done(stage, batch):
+                report.skipped += 1
+                continue
+            try:
+                await send_with_retry(send, batch, report, retries, backoff)
+            except Exception as error:
+                report.failures.append((index, error))
+                continue
+            if journal is not None:
+                journal.record(stage, batch)
+            report.batches += 1
+            report.rows += len(batch)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    report.finish()
+    report.summary()
+    if report.failures:
+        raise BatchFailed(stage, report.failures)
+    return report
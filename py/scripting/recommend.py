@@ -0,0 +1,221 @@
+"""
+Item-item movie recommendations from user ratings.
+
+Ratings from model.py are turned into a sparse user x movie matrix held
+as two CSR copies (by user and by movie), with every rating centered on
+its user's mean. Similarity between movies is the cosine of those
+centered columns (adjusted cosine).
+
+The similarity step is done in blocks of movies: for a block, every
+rating of its movies is expanded to the other movies rated by the same
+user, and products are summed per co-rated (movie, other movie) pair.
+Only the top NEIGHBOURS of each movie are kept, so memory stays at the
+co-ratings of one block plus the neighbour lists, and movies nobody
+rated together never cost anything. Blocks are independent and spread
+over a process pool.
+
+A user's predicted rating for a movie is their mean plus the similarity
+weighted average of their centered ratings of its neighbours.
+
+    python recommend.py [directory] [workers]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dataset_cache
+import model
+
+
+NEIGHBOURS = 50
+BLOCK = 256
+TOP = 10
+
+
+def compressed(owners, targets, values, size):
+    """
+    Sort (owner, target, value) triplets into a Relation and values
+    aligned with its targets.
+    """
+    order = np.argsort(owners, kind="stable")
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners, minlength=size), out=indptr[1:])
+    return model.Relation(indptr, targets[order]), values[order]
+
+
+class RatingMatrix:
+    __slots__ = ("user_movies", "user_values", "movie_users", "movie_values",
+                 "means", "norms", "lowest", "highest")
+
+    def __init__(self, ratings, users, movies):
+        means = (np.bincount(ratings.users, weights=ratings.values,
+                             minlength=users)
+                 / np.maximum(np.bincount(ratings.users, minlength=users), 1))
+        centered = (ratings.values - means[ratings.users]).astype(np.float32)
+        self.means = means.astype(np.float32)
+        self.user_movies, self.user_values = compressed(
+            ratings.users, ratings.movies, centered, users)
+        self.movie_users, self.movie_values = compressed(
+            ratings.movies, ratings.users, centered, movies)
+        squares = centered.astype(np.float64) ** 2
+        self.norms = np.sqrt(np.bincount(ratings.movies, weights=squares,
+                                         minlength=movies))
+        self.lowest = float(ratings.values.min()) if len(ratings) else 0.0
+        self.highest = float(ratings.values.max()) if len(ratings) else 0.0
+
+    @property
+    def movies(self):
+        return len(self.movie_users)
+
+    def similarity_block(self, start, stop, neighbours=NEIGHBOURS):
+        """
+        Top neighbours and their similarities for movies start..stop.
+
+        Only pairs of movies rated by a common user are scored, so the
+        work is proportional to co-ratings rather than block x movies.
+        Rows with fewer candidates than neighbours are padded with
+        movie 0 at similarity 0, which adds nothing to predictions.
+        """
+        movies = self.movies
+        block = np.arange(start, stop)
+        positions = self.movie_users.positions(block)
+        rows = np.repeat(block - start, self.movie_users.degrees()[block])
+        users = self.movie_users.targets[positions]
+        values = self.movie_values[positions]
+        # Expand every rating to the other ratings of the same user.
+        degrees = self.user_movies.degrees()[users]
+        others = self.user_movies.positions(users)
+        products = np.repeat(values, degrees) * self.user_values[others]
+        keys = (np.repeat(rows, degrees).astype(np.int64) * movies
+                + self.user_movies.targets[others])
+        pairs, inverse = np.unique(keys, return_inverse=True)
+        dots = np.bincount(inverse.ravel(), weights=products,
+                           minlength=len(pairs))
+        pair_rows = pairs // movies
+        candidates = pairs % movies
+        with np.errstate(invalid="ignore", divide="ignore"):
+            similarity = dots / (self.norms[block[pair_rows]]
+                                 * self.norms[candidates])
+        similarity[~np.isfinite(similarity)] = 0
+        keep = candidates != block[pair_rows]
+        pair_rows = pair_rows[keep]
+        candidates = candidates[keep]
+        similarity = similarity[keep]
+        # Best first within each row, then the first k of every row.
+        order = np.lexsort((-similarity, pair_rows))
+        pair_rows = pair_rows[order]
+        counts = np.bincount(pair_rows, minlength=len(block))
+        starts = np.zeros(len(block), dtype=np.int64)
+        np.cumsum(counts[:-1], out=starts[1:])
+        ranks = np.arange(len(pair_rows)) - starts[pair_rows]
+        k = min(neighbours, movies)
+        top = ranks < k
+        ids = np.zeros((len(block), k), dtype=np.int32)
+        weights = np.zeros((len(block), k), dtype=np.float32)
+        ids[pair_rows[top], ranks[top]] = candidates[order][top]
+        weights[pair_rows[top], ranks[top]] = similarity[order][top]
+        return ids, weights
+
+
+# Matrix shared with pool workers, set once per worker process.
+shared = None
+
+
+def share(matrix):
+    global shared
+    shared = matrix
+
+
+def block_neighbours(start, stop, neighbours):
+    return shared.similarity_block(start, stop, neighbours)
+
+
+def item_neighbours(matrix, neighbours=NEIGHBOURS, block=BLOCK, workers=None):
+    """
+    Top neighbours of every movie as (ids, similarities) arrays of shape
+    movies x neighbours.
+    """
+    bounds = [(start, min(start + block, matrix.movies))
+              for start in range(0, matrix.movies, block)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(bounds) == 1:
+        parts = [matrix.similarity_block(start, stop, neighbours)
+                 for start, stop in bounds]
+    else:
+        with ProcessPoolExecutor(workers, initializer=share,
+                                 initargs=(matrix,)) as executor:
+            parts = list(executor.map(block_neighbours,
+                                      *zip(*bounds),
+                                      [neighbours] * len(bounds)))
+    return (np.concatenate([ids for ids, _ in parts]),
+            np.concatenate([weights for _, weights in parts]))
+
+
+class Recommender:
+    def __init__(self, matrix, neighbours, similarities):
+        self.matrix = matrix
+        self.neighbours = neighbours
+        self.similarities = similarities
+
+    @classmethod
+    def build(cls, dataset, neighbours=NEIGHBOURS, block=BLOCK, workers=None):
+        matrix = RatingMatrix(dataset.ratings, len(dataset.user_ids),
+                              len(dataset.movie_ids))
+        return cls(matrix, *item_neighbours(matrix, neighbours, block,
+                                            workers))
+
+    def recommend(self, user, k=TOP):
+        """
+        Movie ids and predicted ratings of the k best movies user has
+        not rated yet.
+        """
+        matrix = self.matrix
+        rated = matrix.user_movies.row(user)
+        start = matrix.user_movies.indptr[user]
+        centered = matrix.user_values[start:start + len(rated)]
+        candidates = self.neighbours[rated].ravel()
+        weights = self.similarities[rated]
+        scores = np.bincount(candidates,
+                             weights=(weights * centered[:, None]).ravel(),
+                             minlength=matrix.movies)
+        norms = np.bincount(candidates, weights=np.abs(weights).ravel(),
+                            minlength=matrix.movies)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            predicted = matrix.means[user] + scores / norms
+        np.clip(predicted, matrix.lowest, matrix.highest, out=predicted)
+        predicted[norms == 0] = -np.inf
+        predicted[rated] = -np.inf
+        k = min(k, int(np.count_nonzero(np.isfinite(predicted))))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        best = np.argpartition(-predicted, k - 1)[:k]
+        best = best[np.argsort(-predicted[best], kind="stable")]
+        return best, predicted[best]
+
+
+def main(directory=dataset_cache.DATASETS, workers=None):
+    dataset = model.MoviesDataset.load(directory, dataset_cache.load)
+    if not len(dataset.ratings):
+        print(f"No user_ratings.json in {directory}")
+        return 1
+    started = time.perf_counter()
+    recommender = Recommender.build(dataset, workers=workers)
+    print(f"Built item neighbours from {len(dataset.ratings)} ratings in "
+          f"{time.perf_counter() - started:.2f}s")
+    user = int(np.argmax(recommender.matrix.user_movies.degrees()))
+    movies, scores = recommender.recommend(user)
+    print(f"\nRecommendations for {dataset.users[user].name}")
+    for movie, score in zip(movies.tolist(), scores.tolist()):
+        entity = dataset.movies[movie] if movie < len(dataset.movies) else None
+        print(f"  {score:5.2f}  {getattr(entity, 'title', None)}")
+    return 0
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else dataset_cache.DATASETS
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    sys.exit(main(directory, workers))
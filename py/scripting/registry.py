@@ -0,0 +1,139 @@
+"""
+Named GraphQL documents, loaded once from the queries directory.
+
+Every `<name>.graphql` file becomes a `Query` with a stable SHA-256 hash
+of its text and the variables it declares. `execute` checks variables
+against those declarations before anything is sent, then:
+
+  - over a transport that supports persisted queries (graphql_http.py)
+    sends only the hash, and the full text once when the server does
+    not know it yet,
+  - over the eywa pipe sends the full text, as before.
+
+Plain query strings are passed through unchanged, so one-off queries
+can keep living inline.
+"""
+
+import hashlib
+import os
+import re
+
+import eywa
+
+
+QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "queries")
+
+DEFINITION = re.compile(r"\$(\w+)\s*:\s*([\w\[\]!]+)")
+
+SCALARS = {
+    "Int": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "Float": lambda value: (isinstance(value, (int, float))
+                            and not isinstance(value, bool)),
+    "String": lambda value: isinstance(value, str),
+    "ID": lambda value: isinstance(value, str),
+    "UUID": lambda value: isinstance(value, str),
+    "Boolean": lambda value: isinstance(value, bool),
+}
+
+
+class InvalidVariables(Exception):
+    def __init__(self, query, problems):
+        super().__init__(f"Invalid variables for {query}: "
+                         + "; ".join(problems))
+        self.query = query
+        self.problems = problems
+
+
+def definitions(text):
+    """
+    Variables declared by the operation as name -> GraphQL type.
+    """
+    header = text.split("{", 1)[0]
+    return dict(DEFINITION.findall(header))
+
+
+def type_problem(name, kind, value):
+    if value is None:
+        return f"${name} is required" if kind.endswith("!") else None
+    kind = kind.rstrip("!")
+    if kind.startswith("["):
+        if not isinstance(value, (list, tuple)):
+            return f"${name} should be a list"
+        item = kind[1:-1]
+        for index, element in enumerate(value):
+            problem = type_problem(f"{name}[{index}]", item, element)
+            if problem:
+                return problem
+        return None
+    if kind in SCALARS:
+        return None if SCALARS[kind](value) else f"${name} should be {kind}"
+    if kind.endswith("Input") and not isinstance(value, dict):
+        return f"${name} should be an object"
+    return None
+
+
+class Query:
+    __slots__ = ("name", "text", "hash", "variables")
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.hash = hashlib.sha256(text.encode()).hexdigest()
+        self.variables = definitions(text)
+
+    def validate(self, variables):
+        variables = variables or {}
+        problems = [f"unknown variable ${name}" for name in variables
+                    if name not in self.variables]
+        for name, kind in self.variables.items():
+            problem = type_problem(name, kind, variables.get(name))
+            if problem:
+                problems.append(problem)
+        if problems:
+            raise InvalidVariables(self.name, problems)
+
+    def __repr__(self):
+        return f"Query({self.name!r}, {self.hash[:12]})"
+
+
+class Registry:
+    def __init__(self, directory=QUERIES):
+        self.queries = {}
+        for file_name in sorted(os.listdir(directory)):
+            name, extension = os.path.splitext(file_name)
+            if extension == ".graphql":
+                with open(os.path.join(directory, file_name)) as file:
+                    self.queries[name] = Query(name, file.read().strip())
+
+    def __getitem__(self, name):
+        return self.queries[name]
+
+    def __iter__(self):
+        return iter(self.queries.values())
+
+
+async def execute(query, variables=None, transport=None):
+    """
+    Run a registered Query or a plain query string through transport,
+    eywa by default. Anything with a `graphql(query, variables)`
+    coroutine works; one that also has `persisted(hash, query,
+    variables)` gets persisted query ids.
+    """
+    transport = transport or eywa
+    if isinstance(query, str):
+        return await transport.graphql(query, variables)
+    query.validate(variables)
+    persisted = getattr(transport, "persisted", None)
+    if persisted is None:
+        return await transport.graphql(query.text, variables)
+    return await persisted(query.hash, query.text, variables)
+
+
+queries = Registry()
+
+
+if __name__ == "__main__":
+    for query in queries:
+        variables = ", ".join(f"${name}: {kind}"
+                              for name, kind in query.variables.items())
+        print(f"{query.name:<16} {query.hash[:16]}  {variables}")
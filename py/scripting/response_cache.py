@@ -0,0 +1,186 @@
+"""
+Opt-in client side cache for read-only GraphQL queries.
+
+Responses are keyed by normalized query text (insignificant whitespace
+and commas removed) plus variables, kept for a TTL and bounded in size
+with LRU eviction. Mutations are never cached; a sync*/stack*/slice*/
+delete* mutation sent through the cache drops every cached response
+that depends on the entity it touched, and any other mutation (e.g.
+importDataset) drops them all.
+
+A query depends on the entity of its root fields (searchMovie -> Movie)
+plus the entities RELATED to it, since e.g. a new UserRating changes
+the `_count` and `_agg` computed by searchMovie.
+
+    cache = response_cache.install()   # wraps eywa.graphql
+    ...
+    print(cache.counters())
+
+Cached responses are shared between callers, treat them as read-only.
+"""
+
+import json
+import re
+import time
+from collections import OrderedDict
+
+import eywa
+
+
+TTL = 60
+SIZE = 256
+
+# Entities whose changes show up in queries rooted at the key entity.
+RELATED = {
+    "Movie": ("UserRating", "MovieActor", "MovieGenre"),
+    "MovieActor": ("Movie", "UserRating"),
+    "MovieGenre": ("Movie",),
+    "MovieUser": ("UserRating",),
+    "UserRating": ("Movie", "MovieUser"),
+}
+
+TOKEN = re.compile(r'"(?:\\.|[^"\\])*"|[{}()\[\]:!$=@]|[^\s,{}()\[\]:!$=@"]+')
+ROOT_FIELD = re.compile(
+    r"^(search|get|sync|stack|slice|delete|purge)([A-Z]\w*?)(List|Tree)?$")
+
+
+def tokens(query):
+    return TOKEN.findall(query)
+
+
+def normalize(query):
+    return " ".join(tokens(query))
+
+
+def operation(query):
+    """
+    Return the operation kind and names of its root fields.
+    """
+    parts = tokens(query)
+    kind = "query"
+    if parts and parts[0] in ("query", "mutation", "subscription"):
+        kind = parts[0]
+    fields = []
+    depth = parens = 0
+    for index, token in enumerate(parts):
+        if token == "(":
+            parens += 1
+        elif token == ")":
+            parens -= 1
+        elif parens:
+            continue
+        elif token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+        elif depth == 1 and (token[0].isalpha() or token[0] == "_"):
+            following = parts[index + 1] if index + 1 < len(parts) else None
+            if following != ":" and parts[index - 1] != "@":
+                fields.append(token)
+    return kind, fields
+
+
+def entity(field):
+    match = ROOT_FIELD.match(field)
+    return match.group(2) if match else None
+
+
+class ResponseCache:
+    def __init__(self, graphql=None, ttl=TTL, size=SIZE, related=None,
+                 clock=time.monotonic):
+        self.send = graphql or eywa.graphql
+        self.ttl = ttl
+        self.size = size
+        self.related = RELATED if related is None else related
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+
+    def counters(self):
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "invalidated": self.invalidated,
+                "entries": len(self.entries)}
+
+    def dependencies(self, fields):
+        entities = set()
+        for field in fields:
+            name = entity(field)
+            if name:
+                entities.add(name)
+                entities.update(self.related.get(name, ()))
+        return frozenset(entities)
+
+    def invalidate(self, entities=None):
+        """
+        Drop cached responses depending on any of entities, or all of
+        them when entities is None.
+        """
+        self.generation += 1
+        if entities is None:
+            self.invalidated += len(self.entries)
+            self.entries.clear()
+            return
+        stale = [key for key, (_, _, depends) in self.entries.items()
+                 if depends & entities]
+        for key in stale:
+            del self.entries[key]
+        self.invalidated += len(stale)
+
+    async def mutate(self, query, variables, fields):
+        touched = {entity(field) for field in fields}
+        try:
+            return await self.send(query, variables)
+        finally:
+            self.invalidate(None if None in touched or not touched
+                            else touched)
+
+    async def graphql(self, query, variables=None):
+        kind, fields = operation(query)
+        if kind == "mutation":
+            return await self.mutate(query, variables, fields)
+        if kind != "query":
+            return await self.send(query, variables)
+        key = (normalize(query), json.dumps(variables, sort_keys=True))
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, response, _ = entry
+            if expires > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return response
+            del self.entries[key]
+            self.expired += 1
+        self.misses += 1
+        generation = self.generation
+        response = await self.send(query, variables)
+        # Don't keep responses that a mutation finished during may
+        # have made stale already.
+        if generation == self.generation:
+            self.entries[key] = (self.clock() + self.ttl, response,
+                                 self.dependencies(fields))
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+        return response
+
+
+def install(ttl=TTL, size=SIZE, related=None):
+    """
+    Route every eywa.graphql call in this process through a new cache
+    and return it.
+    """
+    cache = ResponseCache(eywa.graphql, ttl, size, related)
+    eywa.graphql = cache.graphql
+    return cache
+
+
+def uninstall(cache):
+    eywa.graphql = cache.send
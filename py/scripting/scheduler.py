@@ -0,0 +1,107 @@
+"""
+Small dependency aware scheduler for import stages.
+
+Every stage names the stages it requires. Stages whose requirements are
+done run concurrently, limited by a global concurrency cap, and a
+timeline of all stages is printed once everything has finished.
+"""
+
+import asyncio
+import time
+
+
+CONCURRENCY = 4
+TIMELINE_WIDTH = 40
+
+
+class Stage:
+    def __init__(self, name, run, requires=()):
+        self.name = name
+        self.run = run
+        self.requires = tuple(requires)
+        self.started = None
+        self.finished = None
+        self.error = None
+
+
+def ordered(stages):
+    """
+    Return stages in dependency order, failing on unknown
+    requirements and on cycles.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    result = []
+    state = {}
+
+    def visit(stage, path):
+        if state.get(stage.name) == "done":
+            return
+        if state.get(stage.name) == "visiting":
+            cycle = " -> ".join(path + [stage.name])
+            raise ValueError(f"Import stages form a cycle: {cycle}")
+        state[stage.name] = "visiting"
+        for name in stage.requires:
+            if name not in by_name:
+                raise ValueError(f"Stage {stage.name} requires unknown stage {name}")
+            visit(by_name[name], path + [stage.name])
+        state[stage.name] = "done"
+        result.append(stage)
+
+    for stage in stages:
+        visit(stage, [])
+    return result
+
+
+def print_timeline(stages, started):
+    end = max((stage.finished or started) for stage in stages)
+    total = max(end - started, 1e-9)
+    print("\nStage timeline")
+    for stage in stages:
+        if stage.started is None:
+            print(f"  {stage.name:<14} skipped")
+            continue
+        offset = stage.started - started
+        duration = stage.finished - stage.started
+        lead = int(offset / total * TIMELINE_WIDTH)
+        width = max(1, int(duration / total * TIMELINE_WIDTH))
+        bar = " " * lead + "#" * width
+        status = "failed" if stage.error else "ok"
+        print(f"  {stage.name:<14} |{bar:<{TIMELINE_WIDTH}}| "
+              f"{offset:7.2f}s +{duration:7.2f}s {status}")
+    print(f"  total {total:.2f}s")
+
+
+async def run_stages(stages, concurrency=CONCURRENCY):
+    """
+    Run stages as soon as their requirements are done. When a stage
+    fails, stages depending on it are skipped and the first error is
+    raised after the timeline has been printed.
+    """
+    stages = ordered(stages)
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = {}
+    started = time.perf_counter()
+
+    async def run(stage):
+        for name in stage.requires:
+            await tasks[name]
+        async with semaphore:
+            stage.started = time.perf_counter()
+            try:
+                return await stage.run()
+            except Exception as error:
+                stage.error = error
+                raise
+            finally:
+                stage.finished = time.perf_counter()
+                print(f"[{stage.name}] {'failed' if stage.error else 'done'} "
+                      f"in {stage.finished - stage.started:.2f}s")
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(run(stage))
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    print_timeline(stages, started)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return {stage.name: result for stage, result in zip(stages, results)}
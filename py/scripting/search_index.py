@@ -0,0 +1,275 @@
+"""
+Local full-text and prefix search over movie titles and actor names.
+
+Titles and names are tokenized into a sorted vocabulary with a posting
+list (CSR doc ids) per term. Exact terms are found by binary search;
+for a prefix, all matching terms are adjacent in the vocabulary, so the
+docs for it are one contiguous slice of the postings.
+
+The index is written once to `.cache/search.index` next to the datasets
+as a small JSON header followed by raw arrays, and opened with mmap, so
+startup costs no parsing and pages are read only as queries touch them.
+Like dataset_cache.py, it is rebuilt when a source file changes.
+
+    python search_index.py build [directory]
+    python search_index.py search "robust framework" [directory]
+    python search_index.py complete "rob fr" [directory]
+"""
+
+import bisect
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+
+import numpy as np
+
+import dataset_cache
+
+
+INDEX = "search.index"
+FORMAT = 1
+MAGIC = b"EYWASRCH"
+HEADER = struct.Struct("<I")
+ALIGN = 8
+LIMIT = 10
+
+# Dataset file, field that is indexed and kind reported for its rows.
+SOURCES = [("movies", "title", "movie"), ("movie_actors", "name", "actor")]
+KINDS = [kind for _, _, kind in SOURCES]
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return WORD.findall((text or "").casefold())
+
+
+def index_path(directory):
+    return os.path.join(directory, dataset_cache.CACHE_DIR, INDEX)
+
+
+def source_keys(directory):
+    keys = {}
+    for name, _, _ in SOURCES:
+        stat = os.stat(os.path.join(directory, f"{name}.json"))
+        keys[name] = [stat.st_size, stat.st_mtime_ns]
+    return keys
+
+
+def packed(strings):
+    """
+    UTF-8 strings as one byte blob plus offsets.
+    """
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def build(directory=dataset_cache.DATASETS):
+    labels = []
+    euuids = []
+    kinds = array("b")
+    postings = {}
+    for kind, (name, field, _) in enumerate(SOURCES):
+        for row in dataset_cache.load(os.path.join(directory, f"{name}.json")):
+            doc = len(labels)
+            label = row.get(field) or ""
+            labels.append(label)
+            euuids.append(row["euuid"])
+            kinds.append(kind)
+            for term in set(tokenize(label)):
+                postings.setdefault(term.encode(), array("i")).append(doc)
+    # UTF-8 byte order is code point order, so bytes sort like strings.
+    terms = sorted(postings)
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(postings[term]) for term in terms], out=indptr[1:])
+    docs = np.concatenate([np.frombuffer(postings[term], dtype=np.int32)
+                           for term in terms] or [np.zeros(0, np.int32)])
+    term_blob = np.frombuffer(b"".join(terms), dtype=np.uint8)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in terms], out=term_offsets[1:])
+    label_blob, label_offsets = packed(labels)
+    euuid_blob, euuid_offsets = packed(euuids)
+    arrays = {"terms": term_blob, "term_offsets": term_offsets,
+              "indptr": indptr, "docs": docs,
+              "labels": label_blob, "label_offsets": label_offsets,
+              "euuids": euuid_blob, "euuid_offsets": euuid_offsets,
+              "kinds": np.frombuffer(kinds, dtype=np.int8)}
+    write(index_path(directory), source_keys(directory), arrays)
+    return len(labels), len(terms)
+
+
+def write(path, sources, arrays):
+    layout = {}
+    offset = 0
+    for name, values in arrays.items():
+        layout[name] = [values.dtype.str, offset, len(values)]
+        offset += -(-values.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"format": FORMAT, "sources": sources,
+                         "arrays": layout}).encode()
+    start = len(MAGIC) + HEADER.size + len(header)
+    start += -start % ALIGN
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, "wb") as file:
+        file.write(MAGIC + HEADER.pack(len(header)) + header)
+        for name, values in arrays.items():
+            file.seek(start + layout[name][1])
+            file.write(values.tobytes())
+        file.truncate(start + offset)
+    os.replace(partial, path)
+
+
+class Strings:
+    """
+    Sequence view of strings packed in a blob, kept as bytes so binary
+    search compares without decoding.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def text(self, index):
+        return self[index].decode()
+
+
+class SearchIndex:
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a search index")
+        size, = HEADER.unpack_from(self.map, len(MAGIC))
+        start = len(MAGIC) + HEADER.size
+        self.header = json.loads(self.map[start:start + size])
+        start += size
+        start += -start % ALIGN
+        arrays = {name: np.frombuffer(self.map, dtype=dtype, count=count,
+                                      offset=start + offset)
+                  for name, (dtype, offset, count)
+                  in self.header["arrays"].items()}
+        self.terms = Strings(arrays["terms"], arrays["term_offsets"])
+        self.indptr = arrays["indptr"]
+        self.docs = arrays["docs"]
+        self.labels = Strings(arrays["labels"], arrays["label_offsets"])
+        self.euuids = Strings(arrays["euuids"], arrays["euuid_offsets"])
+        self.kinds = arrays["kinds"]
+
+    @classmethod
+    def open(cls, directory=dataset_cache.DATASETS):
+        """
+        Map the index of directory, building it first when it is
+        missing or older than its sources.
+        """
+        path = index_path(directory)
+        try:
+            index = cls(path)
+            if (index.header["format"] == FORMAT
+                    and index.header["sources"] == source_keys(directory)):
+                return index
+            index.close()
+        except (OSError, ValueError):
+            pass
+        build(directory)
+        return cls(path)
+
+    def close(self):
+        self.terms = self.labels = self.euuids = None
+        self.indptr = self.docs = self.kinds = None
+        self.map.close()
+
+    def term_range(self, term, prefix=False):
+        term = term.encode()
+        start = bisect.bisect_left(self.terms, term)
+        if prefix:
+            # No UTF-8 byte is 0xff, so this sorts after every extension.
+            stop = bisect.bisect_left(self.terms, term + b"\xff", start)
+        else:
+            stop = start + (start < len(self.terms)
+                            and self.terms[start] == term)
+        return start, stop
+
+    def postings(self, term, prefix=False):
+        start, stop = self.term_range(term, prefix)
+        docs = self.docs[self.indptr[start]:self.indptr[stop]]
+        return np.unique(docs) if prefix and stop - start > 1 else docs
+
+    def find(self, text, prefix=False):
+        """
+        Doc ids containing every token of text, with each token matched
+        as a prefix of a term when prefix is set ("rob fr" finds
+        "Robust framework").
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return np.zeros(0, dtype=np.int32)
+        lists = sorted((self.postings(token, prefix) for token in tokens),
+                       key=len)
+        docs = lists[0]
+        for other in lists[1:]:
+            if not len(docs):
+                break
+            docs = np.intersect1d(docs, other, assume_unique=True)
+        return docs
+
+    def rank(self, docs, limit):
+        # Shorter labels first: they match the query more closely.
+        offsets = self.labels.offsets
+        lengths = offsets[docs + 1] - offsets[docs]
+        order = np.lexsort((docs, lengths))[:limit]
+        return [{"kind": KINDS[self.kinds[doc]],
+                 "euuid": self.euuids.text(doc),
+                 "label": self.labels.text(doc)}
+                for doc in docs[order].tolist()]
+
+    def search(self, text, limit=LIMIT):
+        return self.rank(self.find(text), limit)
+
+    def complete(self, text, limit=LIMIT):
+        return self.rank(self.find(text, prefix=True), limit)
+
+
+def main(command="build", *args):
+    if command == "build":
+        directory = args[0] if args else dataset_cache.DATASETS
+        started = time.perf_counter()
+        docs, terms = build(directory)
+        print(f"Indexed {docs} titles and names, {terms} terms, in "
+              f"{time.perf_counter() - started:.2f}s "
+              f"({os.path.getsize(index_path(directory)) / 2 ** 10:.0f} KB)")
+        return 0
+    if command in ("search", "complete") and args:
+        directory = args[1] if len(args) > 1 else dataset_cache.DATASETS
+        started = time.perf_counter()
+        index = SearchIndex.open(directory)
+        opened = time.perf_counter()
+        query = getattr(index, command)
+        best = float("inf")
+        for _ in range(5):
+            queried = time.perf_counter()
+            results = query(args[0])
+            best = min(best, time.perf_counter() - queried)
+        for result in results:
+            print(f"  {result['kind']:<6} {result['euuid']}  {result['label']}")
+        print(f"Opened in {(opened - started) * 1000:.2f} ms, "
+              f"{command} took {best * 1e6:.0f} us")
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
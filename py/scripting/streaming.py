@@ -0,0 +1,167 @@
+"""
+Streaming helpers for the movies import.
+
+Dataset files are read incrementally and cut into bounded batches, so
+neither this process nor EYWA ever holds one multi-megabyte mutation.
+"""
+
+import json
+import re
+import time
+
+import registry
+
+
+CHUNK_SIZE = 64 * 1024
+MAX_ROWS = 1000
+MAX_BYTES = 512 * 1024
+
+# What may follow a complete array element.
+ELEMENT_END = re.compile(r"[ \t\r\n]*[,\]]")
+
+
+def iter_json_array(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield elements of a top level JSON array one at a time, reading
+    the file in chunks instead of parsing it as a whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as file:
+        buffer = ""
+        position = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = file.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip(separators):
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in separators:
+                    position += 1
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        skip(" \t\r\n")
+        if position >= len(buffer) or buffer[position] != "[":
+            raise ValueError(f"{path} does not contain a JSON array")
+        position += 1
+
+        while True:
+            skip(" \t\r\n,")
+            if position >= len(buffer):
+                raise ValueError(f"{path} ended before the array was closed")
+            if buffer[position] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A number at the end of the buffer may have been cut short
+            # ("1." of "1.5e10" decodes as 1), so only trust it once the
+            # comma or bracket after it has been read.
+            if not eof and not ELEMENT_END.match(buffer, end):
+                fill()
+                continue
+            position = end
+            yield value
+
+
+def row_size(row):
+    return len(json.dumps(row, separators=(",", ":")).encode("utf-8"))
+
+
+def iter_batches(rows, max_rows=MAX_ROWS, max_bytes=MAX_BYTES):
+    """
+    Group rows into lists bounded by row count and by serialized size.
+    A single row larger than max_bytes is sent alone.
+    """
+    batch = []
+    batch_bytes = 0
+    for row in rows:
+        size = row_size(row) + 1
+        if batch and (len(batch) >= max_rows or batch_bytes + size > max_bytes):
+            yield batch, batch_bytes
+            batch = []
+            batch_bytes = 0
+        batch.append(row)
+        batch_bytes += size
+    if batch:
+        yield batch, batch_bytes
+
+
+class BatchReport:
+    def __init__(self, stage):
+        self.stage = stage
+        self.batches = []
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.skipped = 0
+
+    def record(self, rows, size, duration):
+        self.batches.append((rows, size, duration))
+        rate = rows / duration if duration else float("inf")
+        print(f"[{self.stage}] batch {len(self.batches)}: {rows} rows, "
+              f"{size / 1024:.1f} KB in {duration * 1000:.0f} ms "
+              f"({rate:.0f} rows/s)")
+
+    @property
+    def rows(self):
+        return sum(rows for rows, _, _ in self.batches)
+
+    @property
+    def size(self):
+        return sum(size for _, size, _ in self.batches)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def summary(self):
+        elapsed = self.elapsed
+        if elapsed is None:
+            elapsed = time.perf_counter() - self.started
+        latencies = sorted(duration for _, _, duration in self.batches)
+        rate = self.rows / elapsed if elapsed else float("inf")
+        line = (f"[{self.stage}] {self.rows} rows in {len(self.batches)} "
+                f"batches, {self.size / 1024:.1f} KB, {elapsed:.2f} s "
+                f"({rate:.0f} rows/s)")
+        if latencies:
+            line += (f", batch latency min/median/max "
+                     f"{latencies[0] * 1000:.0f}/"
+                     f"{latencies[len(latencies) // 2] * 1000:.0f}/"
+                     f"{latencies[-1] * 1000:.0f} ms")
+        if self.skipped:
+            line += f", {self.skipped} batches already in journal"
+        print(line)
+        return line
+
+
+async def stream_sync(stage, query, variable, rows,
+                      max_rows=MAX_ROWS, max_bytes=MAX_BYTES, journal=None):
+    """
+    Send rows through a sync mutation one bounded batch at a time.
+    Batches are sent sequentially so memory use stays flat. With a
+    journal, batches it already holds are skipped.
+    """
+    report = BatchReport(stage)
+    for batch, size in iter_batches(rows, max_rows, max_bytes):
+        if journal is not None and journal.done(stage, batch):
+            report.skipped += 1
+            continue
+        started = time.perf_counter()
+        await registry.execute(query, {variable: batch})
+        if journal is not None:
+            journal.record(stage, batch)
+        report.record(len(batch), size, time.perf_counter() - started)
+    report.finish()
+    report.summary()
+    return report
@@ -0,0 +1,181 @@
+"""
+Offline validation of the movies datasets.
+
+Entity files are indexed into hash sets of euuids in a single pass,
+which also catches duplicate euuids, malformed euuids and missing
+required fields. Every relation endpoint in the mapping files (and in
+user_ratings, when present) is then checked against those indexes.
+
+    python validate.py [directory]
+"""
+
+import os
+import re
+import sys
+import time
+
+import dataset_cache
+
+
+UUID = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-"
+                  r"[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+# Dataset file and the fields every row has to carry.
+ENTITIES = {
+    "movies": ("euuid", "title"),
+    "movie_actors": ("euuid", "name"),
+    "movie_genres": ("euuid", "name"),
+    "movie_users": ("euuid", "name"),
+}
+
+# Mapping file, the entity file owning rows and the one its movies point to.
+MAPPINGS = {
+    "movie_actors_mapping": ("movie_actors", "movies"),
+    "movie_genres_mapping": ("movie_genres", "movies"),
+}
+
+# Optional file with rating -> movie and rating -> user references.
+RATINGS = ("user_ratings", {"movie": "movies", "user": "movie_users"})
+
+REPORT_LIMIT = 20
+
+
+class InvalidDatasets(Exception):
+    def __init__(self, issues):
+        super().__init__(f"Datasets have {len(issues)} issues, "
+                         f"first one: {issues[0]}")
+        self.issues = issues
+
+
+class Issue:
+    __slots__ = ("dataset", "index", "euuid", "message")
+
+    def __init__(self, dataset, index, euuid, message):
+        self.dataset = dataset
+        self.index = index
+        self.euuid = euuid
+        self.message = message
+
+    def __str__(self):
+        return (f"{self.dataset}.json row {self.index} ({self.euuid}): "
+                f"{self.message}")
+
+
+def is_uuid(value):
+    return isinstance(value, str) and UUID.match(value) is not None
+
+
+def index_entities(name, rows, required, issues):
+    euuids = set()
+    for index, row in enumerate(rows):
+        euuid = row.get("euuid")
+        for field in required:
+            if row.get(field) in (None, ""):
+                issues.append(Issue(name, index, euuid,
+                                    f"missing required field {field}"))
+        if euuid is None:
+            continue
+        if not is_uuid(euuid):
+            issues.append(Issue(name, index, euuid, "malformed euuid"))
+        if euuid in euuids:
+            issues.append(Issue(name, index, euuid, "duplicate euuid"))
+        euuids.add(euuid)
+    return euuids
+
+
+def check_mapping(name, rows, owners, targets, issues):
+    seen = set()
+    for index, row in enumerate(rows):
+        euuid = row.get("euuid")
+        if euuid not in owners:
+            issues.append(Issue(name, index, euuid, "unknown owner euuid"))
+        if euuid in seen:
+            issues.append(Issue(name, index, euuid, "duplicate owner row"))
+        seen.add(euuid)
+        linked = set()
+        for item in row.get("movies") or ():
+            target = item.get("euuid") if isinstance(item, dict) else None
+            if target not in targets:
+                issues.append(Issue(name, index, euuid,
+                                    f"unknown movie euuid {target}"))
+            elif target in linked:
+                issues.append(Issue(name, index, euuid,
+                                    f"movie {target} linked twice"))
+            linked.add(target)
+
+
+def check_ratings(name, rows, references, issues):
+    euuids = set()
+    for index, row in enumerate(rows):
+        euuid = row.get("euuid")
+        if not is_uuid(euuid):
+            issues.append(Issue(name, index, euuid, "malformed euuid"))
+        elif euuid in euuids:
+            issues.append(Issue(name, index, euuid, "duplicate euuid"))
+        euuids.add(euuid)
+        for field, targets in references.items():
+            reference = row.get(field)
+            target = (reference.get("euuid")
+                      if isinstance(reference, dict) else None)
+            if target not in targets:
+                issues.append(Issue(name, index, euuid,
+                                    f"unknown {field} euuid {target}"))
+
+
+def validate(directory=dataset_cache.DATASETS, load=dataset_cache.load):
+    """
+    Validate all datasets in directory and return the list of issues.
+    `load` may return a list or any iterable of rows.
+    """
+    def path(name):
+        return os.path.join(directory, f"{name}.json")
+
+    issues = []
+    indexes = {name: index_entities(name, load(path(name)), required, issues)
+               for name, required in ENTITIES.items()}
+    for name, (owner, target) in MAPPINGS.items():
+        check_mapping(name, load(path(name)), indexes[owner],
+                      indexes[target], issues)
+    name, references = RATINGS
+    if os.path.exists(path(name)):
+        check_ratings(name, load(path(name)),
+                      {field: indexes[target]
+                       for field, target in references.items()},
+                      issues)
+    return issues
+
+
+def check(directory=dataset_cache.DATASETS, load=dataset_cache.load):
+    """
+    Validate datasets before an import, raising InvalidDatasets with
+    the offending rows reported when anything is wrong. Streaming
+    imports pass streaming.iter_json_array as load, so no file is held
+    in memory as a whole.
+    """
+    issues = validate(directory, load)
+    if issues:
+        report(issues)
+        raise InvalidDatasets(issues)
+
+
+def report(issues, limit=REPORT_LIMIT):
+    for issue in issues[:limit]:
+        print(f"  {issue}")
+    if len(issues) > limit:
+        print(f"  ... and {len(issues) - limit} more")
+
+
+def main(directory=dataset_cache.DATASETS):
+    started = time.perf_counter()
+    issues = validate(directory)
+    elapsed = time.perf_counter() - started
+    if issues:
+        print(f"Found {len(issues)} issues in {elapsed:.2f}s")
+        report(issues)
+        return 1
+    print(f"Datasets are valid ({elapsed:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:2]))